@@ -3,36 +3,308 @@ Agent 1: Document Ingestion Agent
 Converts PDF or image invoices into raw text using OCR or PDF parsing.
 """
 
+import os
+import re
+import gc
+import importlib.util
 import uuid
-import json
+import asyncio
+import hashlib
+import queue
+import functools
+import threading
 import shutil
 import warnings
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterator, TYPE_CHECKING
 from pathlib import Path
-import PyPDF2  # Fallback
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import pypdfium2 as pdfium  # Fallback (PDFium, C-backed)
 import fitz  # PyMuPDF - Best for Arabic PDFs
 import pytesseract
 from PIL import Image
-import io
+import numpy as np
 
 # Suppress EasyOCR/PyTorch warnings
 warnings.filterwarnings('ignore', category=UserWarning, module='torch')
 
+# EasyOCR (fallback for low-quality images) pulls in torch, which takes seconds to import.
+# Only check that it is installed here; it is imported when a Reader is first built.
+EASYOCR_AVAILABLE = importlib.util.find_spec("easyocr") is not None
+
+if TYPE_CHECKING:
+    import easyocr
+
+try:
+    import tesserocr  # In-process Tesseract API (avoids a subprocess + model load per page)
+except ImportError:
+    tesserocr = None
+
+try:
+    import cv2  # Image preprocessing (ships with EasyOCR)
+except ImportError:
+    cv2 = None
+
 try:
-    import easyocr  # Fallback for low-quality images
+    import diskcache  # Persistent OCR result cache
 except ImportError:
-    easyocr = None
+    diskcache = None
 
 from prompts import AGENT_1_DOCUMENT_INGESTION_PROMPT
 
+# PDF pages are rasterized in grayscale at 1.5x zoom (~108 dpi for A4),
+# which keeps text x-height in Tesseract's sweet spot with far fewer pixels than 2x RGB.
+PDF_RENDER_ZOOM = 1.5
+
+# A PDF whose text layer holds at least this many characters is a digital invoice:
+# its text is used as-is and OCR is skipped. Below it (e.g. a scan carrying only a
+# page stamp) the text layer is treated as missing and every page is OCR'd.
+PDF_TEXT_LAYER_MIN_CHARS = 200
+
+# OCR results are cached on disk, keyed by a hash of the input file bytes
+OCR_CACHE_DIR = ".cache/ocr"
+
+# Failure text the OCR paths put into raw_text (per-page markers and whole-file errors).
+# Results containing any of these are not cached, so a transient failure is retried next time.
+_OCR_ERROR_RE = re.compile(
+    r"\[Page \d+ (?:OCR|Processing) Error: "
+    r"|^(?:EasyOCR |Tesseract )?Error(?::| performing OCR| extracting text)",
+    re.MULTILINE
+)
+
+# Skew below this angle (degrees) is left alone to avoid needless resampling
+DESKEW_MIN_ANGLE = 0.5
+
+# EasyOCR batched inference settings for PDF pages.
+# Pages are resized to a common size so they can share one forward pass.
+EASYOCR_BATCH_WIDTH = 1280
+EASYOCR_BATCH_HEIGHT = 1760
+EASYOCR_BATCH_SIZE = 8
+
+# Tesseract is CPU-bound and its internal OpenMP threading scales poorly,
+# so multi-page PDFs are OCR'd with one single-threaded Tesseract per core.
+TESSERACT_POOL_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+_tesseract_pool: Optional[ProcessPoolExecutor] = None
+
+# Persistent tesserocr handle owned by each pool worker process
+_worker_tess_api = None
+
+# Reader construction loads the detector/recognizer weights onto the device,
+# so it is serialized and each (languages, gpu) combination is built once per process.
+_reader_lock = threading.Lock()
+
+
+def _get_reader(langs: Tuple[str, ...], gpu: bool) -> "easyocr.Reader":
+    """Return the shared EasyOCR Reader for the given languages and device."""
+    with _reader_lock:
+        return _build_reader(langs, gpu)
+
+
+@functools.lru_cache(maxsize=4)
+def _build_reader(langs: Tuple[str, ...], gpu: bool) -> "easyocr.Reader":
+    """
+    Create an EasyOCR Reader, warming it up once when running on GPU.
+    
+    On CUDA the detector and recognizer run in FP16; on CPU EasyOCR's
+    dynamic int8 quantization of the recognizer is used instead.
+    """
+    import easyocr
+    import torch  # Already loaded by EasyOCR
+    
+    # Let cuDNN autotune conv algorithms - batched PDF pages share one fixed input size
+    torch.backends.cudnn.benchmark = True
+    
+    reader = easyocr.Reader(list(langs), gpu=gpu, verbose=False, cudnn_benchmark=True, quantize=True)
+    
+    if reader.device == 'cuda':
+        try:
+            _enable_half_precision(reader)
+        except Exception as e:
+            print(f"⚠️  FP16 not available for EasyOCR, using FP32: {e}")
+    
+    if reader.device == 'cuda':
+        # Run one dummy batch so cuDNN autotuning happens before the first real page
+        # (gpu=True silently falls back to CPU, where this would only cost time)
+        dummy_batch = np.zeros(
+            [EASYOCR_BATCH_SIZE, EASYOCR_BATCH_HEIGHT, EASYOCR_BATCH_WIDTH, 3],
+            dtype=np.uint8
+        )
+        reader.readtext_batched(dummy_batch, batch_size=EASYOCR_BATCH_SIZE)
+    
+    return reader
+
+
+def _enable_half_precision(reader: "easyocr.Reader"):
+    """Switch an EasyOCR Reader's detector and recognizer to FP16 inference."""
+    import torch
+    torch.set_float32_matmul_precision('high')
+    
+    def to_float(outputs):
+        if torch.is_tensor(outputs) and outputs.is_floating_point():
+            return outputs.float()
+        if isinstance(outputs, tuple):
+            return tuple(to_float(output) for output in outputs)
+        return outputs
+    
+    for model in (reader.detector, reader.recognizer):
+        model.half()
+        forward = model.forward
+        
+        # EasyOCR feeds FP32 tensors and post-processes the outputs with OpenCV/numpy,
+        # so cast inputs to half on the way in and outputs back to float on the way out
+        def half_forward(*args, _forward=forward, **kwargs):
+            args = [
+                arg.half() if torch.is_tensor(arg) and arg.is_floating_point() else arg
+                for arg in args
+            ]
+            return to_float(_forward(*args, **kwargs))
+        
+        model.forward = half_forward
+
+
+def _init_tesseract_worker(lang: str):
+    """Limit each pooled Tesseract process to one OpenMP thread and load its model once."""
+    global _worker_tess_api
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    
+    if tesserocr is not None:
+        try:
+            _worker_tess_api = tesserocr.PyTessBaseAPI(lang=lang, psm=tesserocr.PSM.AUTO)
+        except Exception:
+            _worker_tess_api = None
+
+
+def _get_tesseract_pool() -> ProcessPoolExecutor:
+    """Return the shared Tesseract process pool, creating it on first use."""
+    global _tesseract_pool
+    if _tesseract_pool is None:
+        _tesseract_pool = ProcessPoolExecutor(
+            max_workers=TESSERACT_POOL_WORKERS,
+            initializer=_init_tesseract_worker,
+            initargs=('ara+eng',)
+        )
+    return _tesseract_pool
+
+
+def _submit_ocr_page(image: np.ndarray) -> Future:
+    """
+    Queue one page on the shared Tesseract pool.
+    
+    A pool whose worker died rejects every later submit, so a broken pool is
+    dropped and rebuilt once before giving up.
+    """
+    pool = _get_tesseract_pool()
+    try:
+        return pool.submit(_ocr_one_page, image, 'ara+eng')
+    except BrokenProcessPool:
+        _discard_tesseract_pool(pool)
+        return _get_tesseract_pool().submit(_ocr_one_page, image, 'ara+eng')
+
+
+def _discard_tesseract_pool(pool: ProcessPoolExecutor):
+    """Forget a broken pool so the next _get_tesseract_pool call builds a fresh one."""
+    global _tesseract_pool
+    if _tesseract_pool is pool:
+        _tesseract_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _set_tess_image(tess_api, image: np.ndarray):
+    """Hand a uint8 pixel buffer straight to tesserocr - no PIL or PNG encoding."""
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+    tess_api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+
+def _ocr_one_page(image: np.ndarray, lang: str, tess_api=None) -> str:
+    """
+    OCR a single rendered PDF page with Tesseract.
+    
+    Defined at module level so it can be dispatched to the process pool.
+    Uses a persistent tesserocr handle when one is available (the given one,
+    or the pool worker's own), otherwise pytesseract - falling back to
+    English-only OCR if the requested languages fail.
+    """
+    tess_api = tess_api or _worker_tess_api
+    if tess_api is not None:
+        _set_tess_image(tess_api, image)
+        return tess_api.GetUTF8Text()
+    
+    try:
+        return pytesseract.image_to_string(image, lang=lang)
+    except Exception as e:
+        try:
+            return pytesseract.image_to_string(image, lang='eng')
+        except Exception:
+            # Re-raise as a plain error so it pickles cleanly back to the parent
+            raise RuntimeError(str(e)) from None
+
+
+def _preprocess(img: np.ndarray) -> np.ndarray:
+    """
+    Prepare a page image for OCR: grayscale, CLAHE contrast boost and deskew.
+    
+    The skew angle is measured on an Otsu-binarized copy, but the rotation is
+    applied to the contrast-enhanced grayscale image - binarized input tends
+    to lower OCR accuracy.
+    
+    Args:
+        img: Page image as a grayscale (H, W) or RGB/RGBA (H, W, C) array
+        
+    Returns:
+        Preprocessed grayscale image (unchanged if OpenCV is not installed)
+    """
+    if cv2 is None:
+        return img
+    
+    if img.ndim == 3:
+        code = cv2.COLOR_RGBA2GRAY if img.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        img = cv2.cvtColor(img, code)
+    
+    gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(img)
+    
+    # Estimate skew from the minimum-area rectangle around all text pixels
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(thresh)
+    if coords is None:
+        return gray
+    
+    angle = cv2.minAreaRect(coords)[-1]
+    # OpenCV >= 4.5 reports angles in (0, 90], older versions in [-90, 0)
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < DESKEW_MIN_ANGLE:
+        return gray
+    
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(
+        gray, matrix, (width, height),
+        flags=cv2.INTER_CUBIC,
+        borderMode=cv2.BORDER_REPLICATE
+    )
+
 
 def check_tesseract_installed() -> Tuple[bool, str]:
     """
     Check if Tesseract OCR is installed and accessible.
     
+    The result is cached for the life of the process, so constructing
+    agents doesn't walk PATH every time.
+    
     Returns:
         Tuple of (is_installed: bool, error_message: str)
     """
+    return _check_tesseract_installed()
+
+
+@functools.lru_cache(maxsize=None)
+def _check_tesseract_installed() -> Tuple[bool, str]:
+    """Uncached Tesseract check - see check_tesseract_installed."""
     tesseract_path = shutil.which("tesseract")
     if tesseract_path:
         return True, ""
@@ -94,6 +366,9 @@ class DocumentIngestionAgent:
         self.prompt = AGENT_1_DOCUMENT_INGESTION_PROMPT
         self.use_easyocr = use_easyocr
         self.easyocr_reader = None
+        self._tess = None  # Persistent tesserocr handle, created on first use
+        self._tess_lock = threading.RLock()  # The handle is shared by all callers of this agent
+        self.ocr_cache = diskcache.Cache(OCR_CACHE_DIR) if diskcache is not None else None
         self.tesseract_available = False
         self.tesseract_error = ""
         
@@ -102,13 +377,13 @@ class DocumentIngestionAgent:
         
         # If Tesseract not available and EasyOCR not enabled, try to enable EasyOCR automatically
         if not self.tesseract_available and not use_easyocr:
-            if easyocr is not None:
+            if EASYOCR_AVAILABLE:
                 try:
                     # Try to initialize EasyOCR as fallback
                     # Suppress warnings during initialization
                     with warnings.catch_warnings():
                         warnings.simplefilter("ignore")
-                        self.easyocr_reader = easyocr.Reader(['ar', 'en'], gpu=True, verbose=False)
+                        self.easyocr_reader = _get_reader(('ar', 'en'), True)
                     self.use_easyocr = True
                     print("⚠️  Tesseract not found. Using EasyOCR as fallback.")
                 except Exception as e:
@@ -118,7 +393,7 @@ class DocumentIngestionAgent:
         
         # Initialize EasyOCR if explicitly requested
         if use_easyocr:
-            if easyocr is None:
+            if not EASYOCR_AVAILABLE:
                 print("⚠️  Warning: EasyOCR not installed. Install with: pip install easyocr")
                 self.use_easyocr = False
             else:
@@ -127,93 +402,199 @@ class DocumentIngestionAgent:
                     # Suppress warnings during initialization
                     with warnings.catch_warnings():
                         warnings.simplefilter("ignore")
-                        self.easyocr_reader = easyocr.Reader(['ar', 'en'], gpu=True, verbose=False)
+                        self.easyocr_reader = _get_reader(('ar', 'en'), True)
                 except Exception as e:
                     print(f"Warning: EasyOCR initialization failed: {e}")
                     if not self.tesseract_available:
                         print("⚠️  No OCR engine available. Please install Tesseract or EasyOCR.")
                     self.use_easyocr = False
     
-    def process(self, file_path: str) -> Dict[str, Any]:
+    def __del__(self):
+        """Release the persistent Tesseract handle."""
+        if getattr(self, "_tess", None):
+            self._tess.End()
+    
+    def _get_tess_api(self):
+        """Return the persistent tesserocr handle, or None to use pytesseract."""
+        with self._tess_lock:
+            if self._tess is None and tesserocr is not None and self.tesseract_available:
+                try:
+                    self._tess = tesserocr.PyTessBaseAPI(lang='ara+eng', psm=tesserocr.PSM.AUTO)
+                except Exception as e:
+                    print(f"⚠️  tesserocr initialization failed, using pytesseract: {e}")
+                    self._tess = False
+            return self._tess or None
+    
+    def process(self, file_path: str,
+                progress_callback: Optional[Callable[[int, int], None]] = None,
+                file_hash: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a PDF or image file and extract raw text.
         
         Args:
             file_path: Path to the invoice file (PDF or image)
+            progress_callback: Called as (pages_done, pages_total) while scanned
+                PDF pages are OCR'd, from the calling thread
+            file_hash: SHA-256 hex digest of the file, if the caller already has it
             
         Returns:
-            Dictionary with document_id, raw_text, and source_type
+            Dictionary with document_id, raw_text, source_type and extraction_method
+            ("text_layer", "ocr" or "text_layer+ocr")
         """
         file_path_obj = Path(file_path)
         document_id = str(uuid.uuid4())
         
+        # Re-uploads of the same file skip OCR entirely
+        cache_key = None
+        if self.ocr_cache is not None:
+            file_hash = file_hash or hashlib.sha256(file_path_obj.read_bytes()).hexdigest()
+            cache_key = f"{file_hash}:{'easyocr' if self.use_easyocr else 'tesseract'}"
+            cached = self.ocr_cache.get(cache_key)
+            if isinstance(cached, dict):
+                return {"document_id": document_id, **cached}
+        
         # Determine file type
         if file_path_obj.suffix.lower() == '.pdf':
-            raw_text = self._extract_from_pdf(file_path)
+            raw_text, extraction_method = self._extract_from_pdf(file_path, progress_callback)
             source_type = "pdf"
         else:
             # Assume image file
             raw_text = self._extract_from_image(file_path)
             source_type = "image"
+            extraction_method = "ocr"
         
-        return {
-            "document_id": document_id,
+        # OCR is where page images and model tensors pile up; reclaim them here
+        # (the Streamlit app turns off its own collection after every rerun)
+        if extraction_method != "text_layer":
+            gc.collect()
+        
+        result = {
             "raw_text": raw_text,
-            "source_type": source_type
+            "source_type": source_type,
+            "extraction_method": extraction_method
         }
+        
+        # Don't cache "no OCR engine" errors - they should go away once an engine is installed -
+        # or results where OCR failed on some page
+        ocr_engine_ready = self.tesseract_available or (self.use_easyocr and self.easyocr_reader)
+        if extraction_method == "text_layer":
+            cacheable = True
+        else:
+            cacheable = bool(ocr_engine_ready) and not _OCR_ERROR_RE.search(raw_text)
+        if cache_key is not None and cacheable:
+            self.ocr_cache[cache_key] = result
+        
+        return {"document_id": document_id, **result}
     
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file using PyMuPDF (best for Arabic)."""
+    async def aprocess(self, file_path: str,
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       file_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Async version of process.
+        
+        Runs in a worker thread: the agent owns the OCR models, so it stays in
+        this process, while multi-page Tesseract work still fans out to the
+        process pool from there.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.process, file_path, progress_callback, file_hash)
+        )
+    
+    def _extract_from_pdf(self, file_path: str,
+                          progress_callback: Optional[Callable[[int, int], None]] = None) -> Tuple[str, str]:
+        """
+        Extract text from PDF file using PyMuPDF (best for Arabic).
+        
+        Digital PDFs are read straight from their text layer; OCR only runs
+        for scanned pages.
+        
+        Returns:
+            Tuple of (text, extraction_method)
+        """
         try:
             # Try PyMuPDF first (best for Arabic PDFs with RTL support)
             doc = fitz.open(file_path)
-            text_parts = []
+            try:
+                # None marks pages without extractable text that still need OCR
+                text_parts = []
+                for page_num in range(len(doc)):
+                    text = doc[page_num].get_text()
+                    text_parts.append(text if text.strip() else None)
+                
+                # Too little embedded text to trust - OCR the whole document instead
+                # (keeping the text layer for any page OCR can't read)
+                text_layer = list(text_parts)
+                ocr_engine_ready = self.tesseract_available or (self.use_easyocr and self.easyocr_reader)
+                text_layer_chars = sum(len(text.strip()) for text in text_parts if text)
+                if text_layer_chars < PDF_TEXT_LAYER_MIN_CHARS and ocr_engine_ready:
+                    text_parts = [None] * len(text_parts)
+                
+                # OCR only the pages without a text layer, reusing the open document
+                ocr_pages = [page_num for page_num, text in enumerate(text_parts) if text is None]
+                if ocr_pages:
+                    ocr_texts = self._ocr_pdf(doc, ocr_pages, progress_callback)
+                    for page_num, text in zip(ocr_pages, ocr_texts):
+                        text_parts[page_num] = text if text and text.strip() else text_layer[page_num]
+            finally:
+                doc.close()
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                text = page.get_text()
-                if text.strip():
-                    text_parts.append(text)
+            extracted_text = "\n".join(text for text in text_parts if text)
             
-            doc.close()
-            extracted_text = "\n".join(text_parts)
+            if not ocr_pages:
+                extraction_method = "text_layer"
+            elif len(ocr_pages) == len(text_parts):
+                extraction_method = "ocr"
+            else:
+                extraction_method = "text_layer+ocr"
             
-            # If PDF has no extractable text, use OCR
-            if not extracted_text.strip():
-                extracted_text = self._ocr_pdf(file_path)
+            if not extracted_text.strip() and not ocr_engine_ready:
+                return (
+                    f"❌ No OCR engine available.\n\n"
+                    f"{self.tesseract_error}\n\n"
+                    f"💡 Tip: Enable 'Use EasyOCR' option in the UI."
+                ), extraction_method
+            if ocr_pages and not self.tesseract_available and self.use_easyocr:
+                extracted_text += "\n\n[Note: Using EasyOCR - Arabic language pack not available]"
             
-            return extracted_text
+            return extracted_text, extraction_method
             
         except Exception as e:
-            # Fallback 1: Try PyPDF2
+            # Fallback: Try pypdfium2
             try:
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
+                pdf = pdfium.PdfDocument(file_path)
+                try:
                     text_parts = []
                     
-                    for page in pdf_reader.pages:
-                        text = page.extract_text()
+                    for page in pdf:
+                        text = page.get_textpage().get_text_bounded()
                         if text.strip():
                             text_parts.append(text)
-                    
-                    extracted_text = "\n".join(text_parts)
-                    if extracted_text.strip():
-                        return extracted_text
-            except:
+                finally:
+                    pdf.close()
+                
+                extracted_text = "\n".join(text_parts)
+                if extracted_text.strip():
+                    return extracted_text, "text_layer"
+            except Exception:
                 pass
             
-            # Fallback 2: Use OCR
-            return self._ocr_pdf(file_path)
+            # PyMuPDF could not read the document, so it cannot be rasterized for OCR either
+            error_msg = f"Error performing OCR on PDF: {str(e)}"
+            if not self.tesseract_available and not (self.use_easyocr and self.easyocr_reader):
+                error_msg += f"\n\n{self.tesseract_error}"
+            return error_msg, "ocr"
     
     def _extract_from_image(self, file_path: str) -> str:
         """Extract text from image using OCR with Arabic+English support."""
         try:
-            image = Image.open(file_path)
+            # Contrast-enhanced, deskewed grayscale feeds both OCR engines
+            image = _preprocess(np.array(Image.open(file_path).convert("L")))
             
             # Use EasyOCR if enabled and initialized
             if self.use_easyocr and self.easyocr_reader:
                 try:
-                    results = self.easyocr_reader.readtext(file_path)
+                    results = self.easyocr_reader.readtext(image)
                     text_parts = [result[1] for result in results]
                     extracted_text = "\n".join(text_parts)
                     if extracted_text.strip():
@@ -236,10 +617,16 @@ class DocumentIngestionAgent:
             # Use Tesseract with Arabic+English language support
             # This handles Arabic digits (٠١٢٣٤٥٦٧٨٩) and Arabic text
             try:
-                text = pytesseract.image_to_string(
-                    image,
-                    lang='ara+eng'  # Arabic + English
-                )
+                tess_api = self._get_tess_api()
+                if tess_api is not None:
+                    with self._tess_lock:
+                        _set_tess_image(tess_api, image)
+                        text = tess_api.GetUTF8Text()
+                else:
+                    text = pytesseract.image_to_string(
+                        image,
+                        lang='ara+eng'  # Arabic + English
+                    )
                 if text.strip():
                     return text
             except pytesseract.TesseractNotFoundError:
@@ -267,79 +654,166 @@ class DocumentIngestionAgent:
                 error_msg += f"\n\n{self.tesseract_error}"
             return error_msg
     
-    def _ocr_pdf(self, file_path: str) -> str:
-        """Use OCR on PDF pages with Arabic+English support."""
-        try:
-            # Use PyMuPDF (fitz) to convert PDF pages to images
-            # This avoids the need for poppler/pdf2image
-            doc = fitz.open(file_path)
-            text_parts = []
+    def _ocr_pdf(self, doc: "fitz.Document", page_indices: List[int],
+                 progress_callback: Optional[Callable[[int, int], None]] = None) -> List[Optional[str]]:
+        """
+        Use OCR on selected PDF pages with Arabic+English support.
+        
+        Args:
+            doc: Open PyMuPDF document
+            page_indices: Indices of the pages to OCR
+            progress_callback: Called as (pages_done, pages_total) as pages finish
             
-            for page_num in range(len(doc)):
+        Returns:
+            OCR text for each requested page, in the same order as page_indices.
+            Pages that no OCR engine could process are returned as None.
+        """
+        page_texts = {}
+        images = {}
+        use_easyocr = bool(self.use_easyocr and self.easyocr_reader)
+        
+        if not (use_easyocr or self.tesseract_available):
+            return [None] * len(page_indices)
+        
+        def report_progress():
+            if progress_callback is not None:
+                progress_callback(len(page_texts), len(page_indices))
+        
+        # Rasterize pages in a background thread while this thread dispatches OCR,
+        # so rendering the next page overlaps with OCR of the previous ones.
+        # Multi-page Tesseract jobs go to the process pool as soon as each page is ready.
+        use_pool = self.tesseract_available and not use_easyocr and len(page_indices) > 1
+        
+        render_queue = queue.Queue(maxsize=2)
+        stop_rendering = threading.Event()
+        producer = threading.Thread(
+            target=self._render_pages,
+            args=(doc, page_indices, render_queue, stop_rendering),
+            daemon=True
+        )
+        producer.start()
+        
+        futures = {}
+        pooled_images = {}
+        item = ()
+        try:
+            while (item := render_queue.get()) is not None:
+                page_num, image, error = item
+                if error is not None:
+                    page_texts[page_num] = error
+                    report_progress()
+                elif use_pool:
+                    # Kept so a page lost to a dead pool worker can be resubmitted
+                    pooled_images[page_num] = image
+                    futures[page_num] = _submit_ocr_page(image)
+                else:
+                    images[page_num] = image
+        finally:
+            # If dispatch failed mid-loop, unblock the producer (it may be waiting on
+            # the full queue) and let it finish before the caller closes the document
+            stop_rendering.set()
+            while item is not None:
+                item = render_queue.get()
+            producer.join()
+        
+        for page_num, text in self._collect_page_futures(futures, pooled_images):
+            page_texts[page_num] = text
+            report_progress()
+        
+        # Use EasyOCR if enabled - all pages go through batched inference at once
+        if images and use_easyocr:
+            try:
+                page_texts.update(self._easyocr_pages(images))
+                images = {}
+                report_progress()
+            except Exception as e:
+                print(f"EasyOCR failed for PDF pages: {e}")
+                if not self.tesseract_available:
+                    images = {}
+        
+        # Use Tesseract with Arabic+English for whatever is left
+        if images and self.tesseract_available:
+            for page_num, text in self._tesseract_pages(images):
+                page_texts[page_num] = text
+                report_progress()
+        
+        return [page_texts.get(page_num) for page_num in page_indices]
+    
+    def _render_pages(self, doc: "fitz.Document", page_indices: List[int], render_queue: queue.Queue,
+                      stop_rendering: threading.Event):
+        """
+        Producer for _ocr_pdf: rasterize and preprocess pages onto render_queue.
+        
+        Puts (page_num, image, error) tuples, then None once all pages are done
+        (or stop_rendering is set).
+        """
+        try:
+            for page_num in page_indices:
+                if stop_rendering.is_set():
+                    break
                 try:
                     page = doc[page_num]
-                    # Render page to image (zoom=2 for better OCR quality)
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    
-                    # Convert fitz Pixmap to PIL Image
-                    img_data = pix.tobytes("png")
-                    image = Image.open(io.BytesIO(img_data))
-                    
-                    # Use EasyOCR if enabled
-                    if self.use_easyocr and self.easyocr_reader:
-                        try:
-                            # Convert PIL image to numpy array for EasyOCR
-                            import numpy as np
-                            img_array = np.array(image)
-                            results = self.easyocr_reader.readtext(img_array)
-                            page_text = "\n".join([result[1] for result in results])
-                            text_parts.append(page_text)
-                            continue
-                        except Exception as e:
-                            print(f"EasyOCR failed for page {page_num}: {e}")
-                            if not self.tesseract_available:
-                                continue
-                    
-                    # Check if Tesseract is available
-                    if not self.tesseract_available:
-                        continue
-                    
-                    # Use Tesseract with Arabic+English
-                    try:
-                        text = pytesseract.image_to_string(image, lang='ara+eng')
-                        text_parts.append(text)
-                    except pytesseract.TesseractNotFoundError:
-                        return (
-                            f"❌ Tesseract OCR is not installed or not in PATH.\n\n"
-                            f"{self.tesseract_error}\n\n"
-                            f"💡 Tip: Enable 'Use EasyOCR' option in the UI to process PDFs without Tesseract."
-                        )
-                    except Exception as e:
-                        # Fallback to English-only OCR
-                        try:
-                            text = pytesseract.image_to_string(image, lang='eng')
-                            text_parts.append(text)
-                        except:
-                            text_parts.append(f"[Page {page_num} OCR Error: {str(e)}]")
-                            
+                    # Render page straight to a grayscale pixel buffer - no PNG round-trip
+                    # (PyMuPDF renders to pixmaps without needing poppler/pdf2image)
+                    pix = page.get_pixmap(
+                        matrix=fitz.Matrix(PDF_RENDER_ZOOM, PDF_RENDER_ZOOM),
+                        colorspace=fitz.csGRAY
+                    )
+                    page_image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+                    render_queue.put((page_num, _preprocess(page_image), None))
                 except Exception as e:
-                     text_parts.append(f"[Page {page_num} Processing Error: {str(e)}]")
-            
-            doc.close()
-            
-            if text_parts:
-                result = "\n".join(text_parts)
-                if not self.tesseract_available and self.use_easyocr:
-                    result += "\n\n[Note: Using EasyOCR - Arabic language pack not available]"
-                return result
-            else:
-                return (
-                    f"❌ No OCR engine available.\n\n"
-                    f"{self.tesseract_error}\n\n"
-                    f"💡 Tip: Enable 'Use EasyOCR' option in the UI."
-                )
-        except Exception as e:
-            error_msg = f"Error performing OCR on PDF: {str(e)}"
-            if not self.tesseract_available and not (self.use_easyocr and self.easyocr_reader):
-                error_msg += f"\n\n{self.tesseract_error}"
-            return error_msg
+                    render_queue.put((page_num, None, f"[Page {page_num} Processing Error: {str(e)}]"))
+        finally:
+            render_queue.put(None)
+    
+    def _tesseract_pages(self, images: Dict[int, np.ndarray]) -> Iterator[Tuple[int, str]]:
+        """Run Tesseract on rendered PDF pages, in parallel when there is more than one.
+        
+        Yields (page_num, text) pairs as pages finish.
+        """
+        if len(images) == 1:
+            page_num, image = next(iter(images.items()))
+            try:
+                with self._tess_lock:
+                    text = _ocr_one_page(image, 'ara+eng', self._get_tess_api())
+            except Exception as e:
+                text = f"[Page {page_num} OCR Error: {str(e)}]"
+            yield page_num, text
+            return
+        
+        futures = {page_num: _submit_ocr_page(image) for page_num, image in images.items()}
+        yield from self._collect_page_futures(futures, images)
+    
+    def _collect_page_futures(self, futures: Dict[int, Future],
+                              images: Dict[int, np.ndarray]) -> Iterator[Tuple[int, str]]:
+        """Wait for pooled per-page OCR jobs, turning failures into per-page error markers.
+        
+        A page lost to a dead worker (BrokenProcessPool) is resubmitted once to a
+        rebuilt pool. Yields (page_num, text) pairs in completion order.
+        """
+        page_nums = {future: page_num for page_num, future in futures.items()}
+        for future in as_completed(page_nums):
+            page_num = page_nums[future]
+            try:
+                yield page_num, future.result()
+            except BrokenProcessPool:
+                try:
+                    yield page_num, _submit_ocr_page(images[page_num]).result()
+                except Exception as e:
+                    yield page_num, f"[Page {page_num} OCR Error: {str(e)}]"
+            except Exception as e:
+                yield page_num, f"[Page {page_num} OCR Error: {str(e)}]"
+    
+    def _easyocr_pages(self, images: Dict[int, np.ndarray]) -> Dict[int, str]:
+        """Run EasyOCR on rendered PDF pages using batched GPU inference."""
+        results = self.easyocr_reader.readtext_batched(
+            list(images.values()),
+            n_width=EASYOCR_BATCH_WIDTH,
+            n_height=EASYOCR_BATCH_HEIGHT,
+            batch_size=EASYOCR_BATCH_SIZE
+        )
+        
+        return {
+            page_num: "\n".join([result[1] for result in page_results])
+            for page_num, page_results in zip(images, results)
+        }
@@ -4,16 +4,219 @@ Extracts structured invoice fields from raw text using semantic understanding.
 Uses OpenRouter API for LLM access.
 """
 
-import json
-from typing import Dict, Any, Optional
-from openai import OpenAI
+import json  # JSONDecodeError (orjson's decode error subclasses it)
+import asyncio
+import atexit
+import threading
+import weakref
+import httpx
+import orjson
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from openai import OpenAI, AsyncOpenAI
 import os
 from dotenv import load_dotenv
 
-from prompts import AGENT_2_EXTRACTION_PROMPT_TEMPLATE
+from tools.extraction_cache import ExtractionCache
+from preprocess import normalize
+from prompts import (
+    AGENT_2_EXTRACTION_STATIC,
+    AGENT_2_BATCH_EXTRACTION_STATIC,
+    AGENT_2_EXTRACTION_HINTS_HEADER,
+    render_agent2,
+    render_batch
+)
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx (pip install httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 load_dotenv()
 
+# Extracted fields are cached on disk by (normalized raw text hash, model)
+EXTRACTION_CACHE_PATH = ".cache/extraction_cache.sqlite"
+
+# Batched extraction limits: invoices per request, and total invoice text per request
+# (keeps the prompt plus the JSON answer well inside the model context window)
+BATCH_MAX_INVOICES = 8
+BATCH_MAX_CHARS = 24000
+BATCH_MAX_TOKENS_PER_INVOICE = 250
+BATCH_INVOICE_MAX_CHARS = 12000  # Longer invoices are extracted on their own, not packed
+
+# Single-invoice extractions in flight at once in aextract_many (EXTRACTION_CONCURRENCY overrides)
+DEFAULT_EXTRACTION_CONCURRENCY = 8
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Role lines prepended to the static extraction instructions in the system message
+EXTRACTION_ROLE = "You are a precise JSON extraction agent specialized in Arabic and multilingual invoices. Return only valid JSON."
+FALLBACK_ROLE = "You are a precise JSON extraction agent. Return only valid JSON."
+# Cheaper model the extraction falls back to (402 / credit errors); OPENROUTER_MODEL_FALLBACK overrides
+FALLBACK_MODEL = os.getenv("OPENROUTER_MODEL_FALLBACK", "openai/gpt-4o-mini")
+
+# Connection pool shared by every agent (and Streamlit session) in the process
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+HTTP_TIMEOUT = 60.0
+
+# Sync client: one pool for the life of the process, closed at exit
+_http_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+atexit.register(_http_client.close)
+
+# Async clients: a pool can only be used on the event loop that opened it,
+# so there is one per loop, closed before the loop ends (see ExtractionAgent.aclose)
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_async_http_clients_lock = threading.Lock()
+
+
+def _get_async_http_client() -> httpx.AsyncClient:
+    """Return the process-wide httpx.AsyncClient for the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _async_http_clients_lock:
+        client = _async_http_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+            _async_http_clients[loop] = client
+        return client
+
+
+async def _aclose_async_http_client():
+    """Close the running event loop's httpx.AsyncClient, if it has one."""
+    loop = asyncio.get_running_loop()
+    with _async_http_clients_lock:
+        client = _async_http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+class _JsonObjectScanner:
+    """Tracks JSON brace depth, ignoring braces inside strings, across streamed chunks."""
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        # Indices (into the last fed text) of commas that end a top-level member
+        self.member_ends = []
+    
+    def feed(self, text: str) -> int:
+        """Return the index just past the brace that closes the top-level object, or -1."""
+        self.member_ends = []
+        for i, char in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.depth > 0:
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}' and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+            elif char == ',' and self.depth == 1:
+                self.member_ends.append(i)
+        return -1
+
+
+def _chunk_text(chunk) -> str:
+    """Return the content delta of a streamed completion chunk ("" if none)."""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def _read_json_object(stream) -> str:
+    """
+    Consume a streamed chat completion until its top-level JSON object closes.
+    
+    Reading stops as soon as the object is complete instead of waiting for
+    trailing tokens. The stream is closed before returning.
+    
+    Args:
+        stream: Streaming response from chat.completions.create(stream=True)
+        
+    Returns:
+        Response text up to and including the closing brace
+        (or everything received if the object never closes)
+    """
+    scanner = _JsonObjectScanner()
+    parts = []
+    
+    try:
+        for chunk in stream:
+            delta = _chunk_text(chunk)
+            end = scanner.feed(delta)
+            if end != -1:
+                parts.append(delta[:end])
+                break
+            parts.append(delta)
+    finally:
+        stream.close()
+    
+    return "".join(parts)
+
+
+async def _aread_json_object(stream) -> str:
+    """Async version of _read_json_object for AsyncOpenAI streams."""
+    scanner = _JsonObjectScanner()
+    parts = []
+    
+    try:
+        async for chunk in stream:
+            delta = _chunk_text(chunk)
+            end = scanner.feed(delta)
+            if end != -1:
+                parts.append(delta[:end])
+                break
+            parts.append(delta)
+    finally:
+        await stream.close()
+    
+    return "".join(parts)
+
+
+async def _aiter_json_fields(stream) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Parse a streamed JSON object incrementally.
+    
+    Yields the fields received so far each time a top-level member is
+    complete, and the whole object once its closing brace arrives. The
+    stream is closed before returning.
+    """
+    scanner = _JsonObjectScanner()
+    received = ""
+    fields_seen = 0
+    
+    try:
+        async for chunk in stream:
+            delta = _chunk_text(chunk)
+            end = scanner.feed(delta)
+            if end != -1:
+                yield orjson.loads(received + delta[:end])
+                return
+            
+            if scanner.member_ends:
+                # Close the object right after the last complete member and parse that prefix
+                prefix = received + delta[:scanner.member_ends[-1]]
+                try:
+                    partial = orjson.loads(prefix[prefix.index('{'):] + "}")
+                except json.JSONDecodeError:
+                    partial = {}
+                if len(partial) > fields_seen:
+                    fields_seen = len(partial)
+                    yield partial
+            received += delta
+    finally:
+        await stream.close()
+    
+    # The object never closed - surface whatever arrived for the caller's fallback parsing
+    raise json.JSONDecodeError("Unterminated JSON object in streamed response", received, len(received))
+
 
 class ExtractionAgent:
     """Extracts invoice fields semantically from raw text.
@@ -36,54 +239,73 @@ class ExtractionAgent:
         
         # Use GPT-4o for Arabic invoices (best choice), or allow override
         # OpenRouter model format: openai/gpt-4o or just gpt-4o
-        default_model = os.getenv("OPENROUTER_MODEL", "openai/gpt-4o")
+        # OPENROUTER_MODEL_EXTRACT is the per-agent setting; OPENROUTER_MODEL is still honored
+        default_model = os.getenv("OPENROUTER_MODEL_EXTRACT") or os.getenv("OPENROUTER_MODEL", "openai/gpt-4o")
         self.model = model or default_model
         
         # Initialize OpenRouter client with custom base URL
         # OpenRouter uses OpenAI-compatible API
+        # Both clients share the module's keep-alive connection pools
         self.client = OpenAI(
             api_key=self.api_key,
-            base_url="https://openrouter.ai/api/v1"
+            base_url=OPENROUTER_BASE_URL,
+            http_client=_http_client
         )
-        self.prompt_template = AGENT_2_EXTRACTION_PROMPT_TEMPLATE
+        # Async client for aextract/aextract_batch, created per event loop (see async_client)
+        self._async_client = None
+        self._async_client_loop = None
+        # The system message (role + static instructions) is identical on every call, so
+        # providers can serve it from their prompt cache; the user message only carries
+        # the invoice (rendered from a pre-split template, see prompts.render_agent2).
+        self._system_prompts = {
+            role: f"{role}\n\n{AGENT_2_EXTRACTION_STATIC}"
+            for role in (EXTRACTION_ROLE, FALLBACK_ROLE)
+        }
+        self.batch_system_prompt = AGENT_2_BATCH_EXTRACTION_STATIC
+        self.extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH)
     
-    def extract(self, raw_text: str) -> Dict[str, Any]:
+    def extract(self, raw_text: str, hints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Extract invoice fields from raw text.
         
         Args:
             raw_text: Raw text extracted from invoice
+            hints: Field values already found deterministically (see preprocess.fast_extract)
             
         Returns:
             Dictionary with extracted invoice fields
         """
-        # Use safe replacement instead of .format() to avoid issues with curly braces 
-        # in the prompt template (JSON schema) or input text
-        prompt = self.prompt_template.replace("{raw_text}", raw_text)
+        # Digit conversion is done here, not by the model (see preprocess.normalize)
+        raw_text = normalize(raw_text)
+        
+        # Retries of the same invoice skip the LLM call entirely
+        cached = self._cache_get(raw_text)
+        if cached is not None:
+            return cached
         
         try:
             # OpenRouter supports OpenAI-compatible API
             # Models can be: openai/gpt-4o, openai/gpt-4o-mini, anthropic/claude-3-opus, etc.
-            response = self.client.chat.completions.create(
+            # Stream the response so we can stop reading as soon as the JSON object closes
+            result_text = ""
+            stream = self.client.chat.completions.create(
                 model=self.model,  # openai/gpt-4o for Arabic invoices (best), or openai/gpt-4o-mini for cost-effective
-                messages=[
-                    {"role": "system", "content": "You are a precise JSON extraction agent specialized in Arabic and multilingual invoices. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._extraction_messages(self.model, EXTRACTION_ROLE, raw_text, hints),
                 temperature=0.1,
                 max_tokens=1000,  # Limit output tokens to save cost and avoid error 402
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                stream=True
             )
             
-            result_text = response.choices[0].message.content
-            extracted_data = json.loads(result_text)
+            result_text = _read_json_object(stream)
+            extracted_data = orjson.loads(result_text)
+            self._cache_set(raw_text, extracted_data)
             
             return extracted_data
             
         except json.JSONDecodeError:
             # Fallback: try to extract JSON from response
             try:
-                result_text = response.choices[0].message.content
                 return self._parse_json_from_text(result_text)
             except:
                 return {
@@ -97,19 +319,17 @@ class ExtractionAgent:
             # Fallback to cheaper model if 402 or other error occurs
             if "402" in str(e) or "credits" in str(e).lower():
                 try:
-                    print("⚠️ Switching to gpt-4o-mini due to credit limit...")
-                    response = self.client.chat.completions.create(
-                        model="openai/gpt-4o-mini",
-                        messages=[
-                            {"role": "system", "content": "You are a precise JSON extraction agent. Return only valid JSON."},
-                            {"role": "user", "content": prompt}
-                        ],
+                    print(f"⚠️ Switching to {FALLBACK_MODEL} due to credit limit...")
+                    stream = self.client.chat.completions.create(
+                        model=FALLBACK_MODEL,
+                        messages=self._extraction_messages(FALLBACK_MODEL, FALLBACK_ROLE, raw_text, hints),
                         temperature=0.1,
                         max_tokens=1000,
-                        response_format={"type": "json_object"}
+                        response_format={"type": "json_object"},
+                        stream=True
                     )
-                    result_text = response.choices[0].message.content
-                    return json.loads(result_text)
+                    result_text = _read_json_object(stream)
+                    return orjson.loads(result_text)
                 except Exception as ex:
                      return {
                         "biller_name": None,
@@ -127,6 +347,363 @@ class ExtractionAgent:
                 "error": str(e)
             }
     
+    async def aextract(self, raw_text: str, hints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Async version of extract, using the AsyncOpenAI client.
+        
+        Lets callers run many extractions concurrently with asyncio.gather
+        instead of blocking on each LLM round-trip.
+        
+        Args:
+            raw_text: Raw text extracted from invoice
+            hints: Field values already found deterministically (see preprocess.fast_extract)
+            
+        Returns:
+            Dictionary with extracted invoice fields
+        """
+        raw_text = normalize(raw_text)
+        cached = self._cache_get(raw_text)
+        if cached is not None:
+            return cached
+        
+        try:
+            # Stream the response so we can stop reading as soon as the JSON object closes
+            result_text = ""
+            stream = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=self._extraction_messages(self.model, EXTRACTION_ROLE, raw_text, hints),
+                temperature=0.1,
+                max_tokens=1000,  # Limit output tokens to save cost and avoid error 402
+                response_format={"type": "json_object"},
+                stream=True
+            )
+            
+            result_text = await _aread_json_object(stream)
+            extracted_data = orjson.loads(result_text)
+            self._cache_set(raw_text, extracted_data)
+            
+            return extracted_data
+            
+        except json.JSONDecodeError:
+            # Fallback: try to extract JSON from response
+            return self._parse_json_from_text(result_text)
+        except Exception as e:
+            # Fallback to cheaper model if 402 or other error occurs
+            if "402" in str(e) or "credits" in str(e).lower():
+                try:
+                    print(f"⚠️ Switching to {FALLBACK_MODEL} due to credit limit...")
+                    stream = await self.async_client.chat.completions.create(
+                        model=FALLBACK_MODEL,
+                        messages=self._extraction_messages(FALLBACK_MODEL, FALLBACK_ROLE, raw_text, hints),
+                        temperature=0.1,
+                        max_tokens=1000,
+                        response_format={"type": "json_object"},
+                        stream=True
+                    )
+                    result_text = await _aread_json_object(stream)
+                    return orjson.loads(result_text)
+                except Exception as ex:
+                    return {
+                        "biller_name": None,
+                        "biller_address": None,
+                        "total_amount": None,
+                        "due_date": None,
+                        "error": f"Fallback failed: {str(ex)}"
+                    }
+            
+            return {
+                "biller_name": None,
+                "biller_address": None,
+                "total_amount": None,
+                "due_date": None,
+                "error": str(e)
+            }
+    
+    async def aextract_stream(self, raw_text: str, hints: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Extract invoice fields, yielding them as the LLM streams them.
+        
+        Each yielded dictionary holds every field received so far; the last
+        one is the complete result (the same dictionary aextract returns).
+        
+        Args:
+            raw_text: Raw text extracted from invoice
+            hints: Field values already found deterministically (see preprocess.fast_extract)
+            
+        Yields:
+            Dictionaries of the invoice fields extracted so far
+        """
+        raw_text = normalize(raw_text)
+        cached = self._cache_get(raw_text)
+        if cached is not None:
+            yield cached
+            return
+        
+        attempts = [(self.model, EXTRACTION_ROLE), (FALLBACK_MODEL, FALLBACK_ROLE)]
+        
+        for model, role in attempts:
+            extracted_data = None
+            try:
+                stream = await self.async_client.chat.completions.create(
+                    model=model,
+                    messages=self._extraction_messages(model, role, raw_text, hints),
+                    temperature=0.1,
+                    max_tokens=1000,  # Limit output tokens to save cost and avoid error 402
+                    response_format={"type": "json_object"},
+                    stream=True
+                )
+                async for extracted_data in _aiter_json_fields(stream):
+                    yield extracted_data
+                
+                if model == self.model:
+                    self._cache_set(raw_text, extracted_data)
+                return
+                
+            except json.JSONDecodeError as e:
+                yield self._parse_json_from_text(e.doc)
+                return
+            except Exception as e:
+                # Fallback to cheaper model if 402 or other error occurs
+                if model == self.model and ("402" in str(e) or "credits" in str(e).lower()):
+                    print(f"⚠️ Switching to {FALLBACK_MODEL} due to credit limit...")
+                    continue
+                
+                yield {
+                    "biller_name": None,
+                    "biller_address": None,
+                    "total_amount": None,
+                    "due_date": None,
+                    "error": str(e) if model == self.model else f"Fallback failed: {str(e)}"
+                }
+                return
+    
+    def extract_many(self, raw_texts: List[str], concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Extract invoice fields from several raw texts, one LLM call per invoice, concurrently.
+        
+        Synchronous wrapper around aextract_many.
+        
+        Args:
+            raw_texts: Raw texts extracted from invoices
+            concurrency: Max calls in flight (default: EXTRACTION_CONCURRENCY env or 8)
+            
+        Returns:
+            List of extracted invoice field dictionaries, in the same order as raw_texts
+        """
+        return self._run(self.aextract_many(raw_texts, concurrency))
+    
+    async def aextract_many(self, raw_texts: List[str], concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Async version of extract_many.
+        
+        Unlike aextract_batch each invoice keeps its own prompt (and cache entry);
+        the round-trips overlap instead, bounded by a semaphore so a large
+        upload stays under the provider rate limits.
+        """
+        if concurrency is None:
+            concurrency = int(os.getenv("EXTRACTION_CONCURRENCY", DEFAULT_EXTRACTION_CONCURRENCY))
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def extract_one(raw_text: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.aextract(raw_text)
+        
+        return await asyncio.gather(*[extract_one(raw_text) for raw_text in raw_texts])
+    
+    def extract_batch(self, raw_texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Extract invoice fields from several raw texts using as few LLM calls as possible.
+        
+        Args:
+            raw_texts: Raw texts extracted from invoices
+            
+        Returns:
+            List of extracted invoice field dictionaries, in the same order as raw_texts
+        """
+        return self._run(self.aextract_batch(raw_texts))
+    
+    async def aextract_batch(self, raw_texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Async version of extract_batch.
+        
+        Invoices are packed into batches of up to BATCH_MAX_INVOICES (and
+        BATCH_MAX_CHARS of text); each batch is one LLM request and all
+        batch requests run concurrently. Invoices longer than
+        BATCH_INVOICE_MAX_CHARS go through aextract on their own.
+        """
+        if not raw_texts:
+            return []
+        
+        raw_texts = [normalize(raw_text) for raw_text in raw_texts]
+        singles = [
+            (invoice_id, raw_text) for invoice_id, raw_text in enumerate(raw_texts)
+            if len(raw_text) > BATCH_INVOICE_MAX_CHARS
+        ]
+        batches = self._pack_batches([
+            (invoice_id, raw_text) for invoice_id, raw_text in enumerate(raw_texts)
+            if len(raw_text) <= BATCH_INVOICE_MAX_CHARS
+        ])
+        batch_results, single_results = await asyncio.gather(
+            asyncio.gather(*[self._aextract_packed(batch) for batch in batches]),
+            asyncio.gather(*[self.aextract(raw_text) for _, raw_text in singles])
+        )
+        
+        results = {}
+        for batch_result in batch_results:
+            results.update(batch_result)
+        for (invoice_id, _), single_result in zip(singles, single_results):
+            results[invoice_id] = single_result
+        return [results[invoice_id] for invoice_id in range(len(raw_texts))]
+    
+    async def aclose(self):
+        """
+        Close the pooled async HTTP connections of the running event loop.
+        
+        Await this before a short-lived loop (asyncio.run) ends; otherwise its
+        client is left for the garbage collector with connections still open.
+        """
+        if self._async_client_loop is asyncio.get_running_loop():
+            self._async_client = None
+            self._async_client_loop = None
+        await _aclose_async_http_client()
+    
+    def _run(self, coro):
+        """asyncio.run for the sync wrappers, closing the loop's HTTP client before the loop ends."""
+        async def run_and_close():
+            try:
+                return await coro
+            finally:
+                await self.aclose()
+        
+        return asyncio.run(run_and_close())
+    
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """
+        AsyncOpenAI client bound to the running event loop.
+        
+        Pooled async connections can't be reused from a different event loop,
+        and sync wrappers (asyncio.run) start a new loop on every call -
+        so a fresh client is created whenever the loop changes. Its
+        connections come from the httpx pool shared by all agents on that loop.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_client
+        if client is None or self._async_client_loop is not loop:
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=OPENROUTER_BASE_URL,
+                http_client=_get_async_http_client()
+            )
+            self._async_client = client
+            self._async_client_loop = loop
+        return client
+    
+    def _extraction_messages(self, model: str, role: str, raw_text: str,
+                             hints: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Build the chat messages for a single-invoice extraction.
+        
+        Static instructions go first (system), the invoice text last (user),
+        followed by any fields already found without the LLM.
+        """
+        user_content = render_agent2(raw_text)
+        if hints:
+            user_content += AGENT_2_EXTRACTION_HINTS_HEADER + orjson.dumps(hints).decode()
+        return [
+            self._system_message(model, self._system_prompts[role]),
+            {"role": "user", "content": user_content}
+        ]
+    
+    def _system_message(self, model: str, system_prompt: str) -> Dict[str, Any]:
+        """
+        System message carrying static instructions.
+        
+        OpenAI models cache a long enough prefix automatically; Anthropic
+        models need the static block marked with cache_control.
+        """
+        if model.startswith("anthropic/"):
+            return {
+                "role": "system",
+                "content": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+            }
+        return {"role": "system", "content": system_prompt}
+    
+    def _cache_get(self, raw_text: str) -> Optional[Dict[str, Any]]:
+        """Return the cached extraction of this text by this agent's model, or None on a miss."""
+        return self.extraction_cache.get(raw_text, self.model)
+    
+    def _cache_set(self, raw_text: str, extracted_data: Dict[str, Any]):
+        """Cache a successful extraction - error results are never stored."""
+        if isinstance(extracted_data, dict) and "error" not in extracted_data:
+            self.extraction_cache.set(raw_text, self.model, extracted_data)
+    
+    def _pack_batches(self, invoices: List[Tuple[int, str]]) -> List[List[Tuple[int, str]]]:
+        """Greedily group (id, text) pairs into batches that respect the batch limits."""
+        batches = []
+        current = []
+        current_chars = 0
+        
+        for invoice_id, raw_text in invoices:
+            if current and (len(current) >= BATCH_MAX_INVOICES or current_chars + len(raw_text) > BATCH_MAX_CHARS):
+                batches.append(current)
+                current = []
+                current_chars = 0
+            current.append((invoice_id, raw_text))
+            current_chars += len(raw_text)
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    async def _aextract_packed(self, batch: List[Tuple[int, str]]) -> Dict[int, Dict[str, Any]]:
+        """Extract fields for one batch of invoices with a single LLM call."""
+        prompt, id_map = render_batch(
+            [raw_text for _, raw_text in batch],
+            [invoice_id for invoice_id, _ in batch]
+        )
+        
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    self._system_message(self.model, self.batch_system_prompt),
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=BATCH_MAX_TOKENS_PER_INVOICE * len(batch),
+                response_format={"type": "json_object"}
+            )
+            result_text = response.choices[0].message.content
+            try:
+                batch_data = orjson.loads(result_text)
+            except json.JSONDecodeError:
+                batch_data = self._parse_json_from_text(result_text)
+        except Exception as e:
+            batch_data = {"error": str(e)}
+        
+        # Results carry the invoice number from the prompt header; map it back to our id
+        results_by_id = {
+            id_map.get(item.get("invoice")): item
+            for item in batch_data.get("results", [])
+            if isinstance(item, dict)
+        }
+        
+        extracted = {}
+        for invoice_id, _ in batch:
+            item = results_by_id.get(invoice_id)
+            if item is None:
+                extracted[invoice_id] = {
+                    "biller_name": None,
+                    "biller_address": None,
+                    "total_amount": None,
+                    "due_date": None,
+                    "error": batch_data.get("error", "Invoice missing from batch response")
+                }
+            else:
+                extracted[invoice_id] = {key: value for key, value in item.items() if key != "invoice"}
+        return extracted
+    
     def _parse_json_from_text(self, text: str) -> Dict[str, Any]:
         """Try to extract JSON from text response."""
         try:
@@ -136,7 +713,7 @@ class ExtractionAgent:
             
             if start_idx != -1 and end_idx > start_idx:
                 json_str = text[start_idx:end_idx]
-                return json.loads(json_str)
+                return orjson.loads(json_str)
         except:
             pass
         
@@ -13,20 +13,28 @@ class ToolDecisionAgent:
     def __init__(self):
         self.prompt_template = AGENT_4_TOOL_DECISION_PROMPT_TEMPLATE
     
-    def decide(self, validation_result: Dict[str, Any], extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+    def decide(self, validation_result: Dict[str, Any], extracted_data: Dict[str, Any],
+               duplicate: bool = False) -> Dict[str, Any]:
         """
         Decide whether to call database write tool.
         
         Args:
             validation_result: Result from validation agent
             extracted_data: Extracted invoice data
+            duplicate: True if the same invoice is already stored in the database
             
         Returns:
             Dictionary with decision and action
         """
         status = validation_result.get("status", "incomplete")
         
-        if status == "valid":
+        if status == "valid" and duplicate:
+            return {
+                "should_write": False,
+                "reason": "Duplicate invoice: already stored in database",
+                "data_to_write": None
+            }
+        elif status == "valid":
             return {
                 "should_write": True,
                 "reason": "Invoice validation passed",
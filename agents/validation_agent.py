@@ -3,13 +3,54 @@ Agent 3: Validation Agent
 Validates extracted invoice fields according to business rules.
 """
 
+import re
 import json
-from typing import Dict, Any, List
+import functools
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from dateutil import parser
 
 from prompts import AGENT_3_VALIDATION_PROMPT_TEMPLATE
 
+try:
+    import fastjsonschema  # Compiles the schema below into a straight-line Python check
+except ImportError:
+    fastjsonschema = None
+
+# Arabic-Indic digits -> ASCII; Arabic decimal (٫) and thousands (٬) separators -> "." and ","
+_AR_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩٫٬', '0123456789.,')
+# Currency codes/symbols and whitespace allowed around an amount
+_CURRENCY_RE = re.compile(r'SAR|USD|EUR|AED|KWD|QAR|BHD|OMR|EGP|JOD|LBP|ر\.س|ريال|\$|﷼|\s', re.IGNORECASE)
+# The whole remaining string must be the number; "," only as a thousands separator (groups of three)
+_NUM_RE = re.compile(r'-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?')
+
+# Fast path for the date formats invoices actually use (ISO, DD/MM/YYYY, DD-MM-YYYY)
+_DATE_RE = re.compile(r'^(\d{4}-\d{2}-\d{2}|\d{1,2}[/-]\d{1,2}[/-]\d{2,4})$')
+_DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%d/%m/%Y", "%d-%m-%Y",
+    "%m/%d/%Y", "%m-%d-%Y",
+    "%d/%m/%y", "%d-%m-%y",
+    "%m/%d/%y", "%m-%d-%y",
+)
+
+# Shape of an invoice that needs no further number parsing: biller present and a
+# positive numeric amount. Anything else (Arabic-digit or "SAR 1,250" amounts,
+# missing fields) goes through the field-by-field checks, which also word the errors.
+INVOICE_SCHEMA = {
+    "type": "object",
+    "required": ["biller_name", "total_amount"],
+    "properties": {
+        "biller_name": {"not": {"type": "null"}},
+        "total_amount": {"type": "number", "exclusiveMinimum": 0},
+        "due_date": {"type": ["string", "null"]}
+    }
+}
+_validate_invoice_schema = fastjsonschema.compile(INVOICE_SCHEMA) if fastjsonschema is not None else None
+
+# Bump when the validation rules change, so results memoized under the old rules are never reused
+VALIDATION_RULES_VERSION = 3
+VALIDATION_CACHE_SIZE = 4096
+
 
 class ValidationAgent:
     """Validates extracted invoice data."""
@@ -21,32 +62,80 @@ class ValidationAgent:
         """
         Validate extracted invoice fields.
         
+        Results are memoized per process on the canonical JSON of the input,
+        so duplicate and reprocessed invoices skip the checks.
+        
         Args:
             extracted_data: Dictionary with extracted invoice fields
             
         Returns:
             Dictionary with validation status and errors
         """
+        try:
+            canonical_data = json.dumps(extracted_data, sort_keys=True, separators=(",", ":"))
+        except (TypeError, ValueError):
+            # Not JSON-serializable, so it can't be a cache key
+            return self._validate_fields(extracted_data)
+        
+        status, errors = self._validate_canonical(VALIDATION_RULES_VERSION, canonical_data)
+        # Fresh dict and list per call - callers may modify the result
+        return {
+            "status": status,
+            "errors": list(errors)
+        }
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+    def _validate_canonical(rules_version: int, canonical_data: str) -> Tuple[str, Tuple[str, ...]]:
+        """Validate canonical invoice JSON; the cached result is kept immutable."""
+        result = ValidationAgent._validate_fields(json.loads(canonical_data))
+        return result["status"], tuple(result["errors"])
+    
+    @staticmethod
+    def _validate_fields(extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the field checks on extracted invoice data."""
+        # A failed extraction never validates, whatever fields came with it
+        if "error" in extracted_data:
+            return {
+                "status": "incomplete",
+                "errors": [f"Extraction failed: {extracted_data['error']}"]
+            }
+        
         errors = []
         
+        total_amount = extracted_data.get("total_amount")
+        due_date = extracted_data.get("due_date")
+        
+        # Fast path: well-formed invoices only need the date checked
+        if _validate_invoice_schema is not None:
+            try:
+                _validate_invoice_schema(extracted_data)
+            except fastjsonschema.JsonSchemaException:
+                pass
+            else:
+                if due_date is None or ValidationAgent._is_valid_date(due_date):
+                    return {
+                        "status": "valid",
+                        "errors": []
+                    }
+        
         # Check required fields (Relaxed address requirement)
         required_fields = ["biller_name", "total_amount"]
         for field in required_fields:
-            if field not in extracted_data or extracted_data[field] is None:
+            if extracted_data.get(field) is None:
                 errors.append(f"Missing required field: {field}")
         
         # Validate total_amount
-        if "total_amount" in extracted_data and extracted_data["total_amount"] is not None:
-            try:
-                amount = float(extracted_data["total_amount"])
-                if amount <= 0:
-                    errors.append("total_amount must be a positive number")
-            except (ValueError, TypeError):
+        if total_amount is not None:
+            amount = ValidationAgent._parse_amount(total_amount)
+            if amount is None:
                 errors.append("total_amount must be a valid number")
+            elif amount <= 0:
+                errors.append("total_amount must be a positive number")
         
         # Validate due_date
-        if "due_date" in extracted_data and extracted_data["due_date"] is not None:
-            if not self._is_valid_date(extracted_data["due_date"]):
+        if due_date is not None:
+            if not ValidationAgent._is_valid_date(due_date):
                 errors.append("due_date must be a valid date format")
         
         # Return validation result
@@ -61,11 +150,45 @@ class ValidationAgent:
                 "errors": errors
             }
     
-    def _is_valid_date(self, date_str: str) -> bool:
+    async def avalidate(self, extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async version of validate, so it can be gathered with I/O-bound checks.
+        
+        Validation is pure CPU work on a handful of fields, so it runs inline.
+        """
+        return self.validate(extracted_data)
+    
+    @staticmethod
+    def _parse_amount(value: Any) -> Optional[float]:
+        """Parse an amount, accepting Arabic digits and text such as "SAR ١٬٢٥٠٫٥٠"."""
+        if isinstance(value, str):
+            candidate = _CURRENCY_RE.sub('', value.translate(_AR_DIGITS))
+            if not _NUM_RE.fullmatch(candidate):
+                return None
+            return float(candidate.replace(',', ''))
+        
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return None
+    
+    @staticmethod
+    def _is_valid_date(date_str: str) -> bool:
         """Check if date string is valid."""
+        if isinstance(date_str, str):
+            candidate = date_str.strip()
+            if _DATE_RE.match(candidate):
+                for date_format in _DATE_FORMATS:
+                    try:
+                        datetime.strptime(candidate, date_format)
+                        return True
+                    except ValueError:
+                        continue
+        
+        # Fall back to the general-purpose parser for anything else
+        from dateutil import parser
         try:
-            # Try parsing the date
-            parsed_date = parser.parse(date_str)
+            parser.parse(date_str)
             return True
-        except (ValueError, TypeError):
+        except (ValueError, TypeError, OverflowError):
             return False
@@ -4,14 +4,26 @@ Demonstrates the step-by-step pipeline execution with Human-in-the-Loop verifica
 """
 
 import streamlit as st
-import json
+import orjson
 import os
+import asyncio
+import hashlib
+import atexit
+import shutil
+import tempfile
 import warnings
 import time
 from pathlib import Path
 from orchestrator import InvoiceProcessingOrchestrator
+from preprocess import HINT_FIELDS, fast_extract, merge_fields
+from check_tesseract import tesseract_status
 from dotenv import load_dotenv
 
+try:
+    import rcssmin  # Optional: minifies the stylesheet once per process
+except ImportError:
+    rcssmin = None
+
 # Suppress warnings
 warnings.filterwarnings('ignore', category=UserWarning)
 load_dotenv()
@@ -24,121 +36,102 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- Premium CSS Styling ---
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    html, body, [class*="css"] {
-        font-family: 'Inter', sans-serif;
-    }
+# --- Styling ---
+# Base colors live in .streamlit/config.toml; the few custom rules are read (and minified) once per process
+@st.cache_resource
+def load_css():
+    css = (Path(__file__).parent / "static" / "custom.css").read_text(encoding="utf-8")
+    return rcssmin.cssmin(css) if rcssmin is not None else css
 
-    /* Main Container */
-    .stApp {
-        background-color: #f8fafc;
-    }
+st.html(f"<style>{load_css()}</style>")
 
-    /* Cards */
-    .agent-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 12px;
-        border: 1px solid #e2e8f0;
-        box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.05);
-        margin-bottom: 1.5rem;
-        transition: all 0.3s ease;
-    }
-    .agent-card:hover {
-        box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.05);
-        transform: translateY(-2px);
-    }
-
-    /* Headlines */
-    h1 {
-        font-weight: 800;
-        letter-spacing: -0.025em;
-        color: #0f172a;
-    }
-    h2, h3 {
-        font-weight: 600;
-        color: #334155;
-    }
-
-    /* Status Badges */
-    .status-badge {
-        display: inline-flex;
-        align-items: center;
-        padding: 0.25rem 0.75rem;
-        border-radius: 9999px;
-        font-size: 0.75rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-    }
-    .status-success { background: #b0f2b6; color: #166534; }
-    .status-error { background: #fecaca; color: #991b1b; }
-    .status-pending { background: #e2e8f0; color: #475569; }
-    
-    /* Metrics */
-    .metric-card {
-        background: white;
-        padding: 1rem;
-        border-radius: 10px;
-        border: 1px solid #e2e8f0;
-        text-align: center;
-    }
-    .metric-val { font-size: 1.5rem; font-weight: 700; color: #0f172a; }
-    .metric-lbl { font-size: 0.875rem; color: #64748b; font-weight: 500; }
-
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def get_upload_dir():
+    # One private upload directory per server process, removed on exit so uploads don't pile up
+    upload_dir = Path(tempfile.mkdtemp(prefix="invoice_uploads_"))
+    atexit.register(shutil.rmtree, upload_dir, ignore_errors=True)
+    return upload_dir
 
 # --- Session State Management ---
-if 'orchestrator' not in st.session_state:
-    st.session_state.orchestrator = None
-if 'ingestion_result' not in st.session_state:
-    st.session_state.ingestion_result = None
-if 'extraction_result' not in st.session_state:
-    st.session_state.extraction_result = None
-if 'processing_complete' not in st.session_state:
-    st.session_state.processing_complete = False
+SESSION_DEFAULTS = {
+    'orchestrator': None,
+    'ingestion_result': None,
+    'extraction_result': None,
+    'processing_complete': False,
+    'file_hash': None,
+    'upload_id': None,
+    'upload_path': None
+}
+for key, value in SESSION_DEFAULTS.items():
+    st.session_state.setdefault(key, value)
+
+@st.cache_resource(show_spinner="Loading agents...")
+def get_orchestrator(api_key, model, use_easyocr):
+    # Shared across reruns and sessions: OCR models and HTTP clients load once per server process
+    return InvoiceProcessingOrchestrator(
+        openrouter_api_key=api_key,
+        model=model,
+        use_easyocr=use_easyocr
+    )
 
 def init_orchestrator(api_key, model, use_easyocr):
-    if not st.session_state.orchestrator:
-        st.session_state.orchestrator = InvoiceProcessingOrchestrator(
-            openrouter_api_key=api_key,
-            model=model,
-            use_easyocr=use_easyocr
-        )
+    st.session_state.orchestrator = get_orchestrator(api_key, model, use_easyocr)
 
 # --- Helper Functions ---
+# String values longer than this are summarized in step cards and offered as a download instead
+CARD_MAX_VALUE_CHARS = 2048
+# The fields a reviewer verifies - the only part of the extraction result worth rendering
+INVOICE_FIELDS = ("biller_name", "biller_address", "total_amount", "due_date")
+
 def render_step_card(title, icon, status, content=None, error=None, is_expanded=False):
     status_map = {
-        "success": ("✅ Success", "status-success"),
-        "error": ("❌ Failed", "status-error"),
-        "pending": ("⏳ Pending", "status-pending")
+        "success": ("✅ Success", "green"),
+        "error": ("❌ Failed", "red"),
+        "pending": ("⏳ Pending", "gray")
     }
-    msg, cls = status_map.get(status, ("⚪ Unknown", "status-pending"))
-    
-    st.markdown(f"""
-    <div class="agent-card">
-        <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:10px;">
-            <div style="display:flex; align-items:center; gap:10px;">
-                <span style="font-size:1.5rem; background:#f1f5f9; padding:8px; border-radius:8px;">{icon}</span>
-                <h3 style="margin:0;">{title}</h3>
-            </div>
-            <span class="status-badge {cls}">{msg}</span>
-        </div>
-    """, unsafe_allow_html=True)
+    msg, color = status_map.get(status, ("⚪ Unknown", "gray"))
     
-    if error:
-        st.error(f"Error: {error}")
+    with st.container(border=True):
+        col_title, col_badge = st.columns([4, 1], vertical_alignment="center")
+        with col_title:
+            st.markdown(f"### {icon} {title}")
+        with col_badge:
+            st.badge(msg, color=color)
+        
+        if error:
+            st.error(f"Error: {error}")
+        
+        if content:
+            with st.expander("View Details", expanded=is_expanded):
+                long_values = {
+                    key: value for key, value in content.items()
+                    if isinstance(value, str) and len(value) > CARD_MAX_VALUE_CHARS
+                }
+                shown = {**content, **{key: f"<{len(value)} chars>" for key, value in long_values.items()}}
+                # Pre-serialized JSON renders as a plain code block - cheaper than st.json's interactive tree
+                st.code(orjson.dumps(shown, option=orjson.OPT_INDENT_2).decode(), language="json")
+                for key, value in long_values.items():
+                    st.download_button(f"⬇️ Full {key}", data=value, file_name=f"{key}.txt", key=f"{title}-{key}")
+
+async def stream_extraction(extraction_agent, raw_text):
+    # Fields stated unambiguously need no LLM call; the rest are streamed from the model
+    found = fast_extract(raw_text)
+    if not found["missing"]:
+        # Biller matches are only hints: prefill them for the reviewer, who confirms them in the form
+        return {**merge_fields(found, {}), **{field: found[field] for field in HINT_FIELDS}}
+    hints = {field: value for field, value in found.items() if field != "missing" and value is not None}
     
-    if content:
-        with st.expander("View Details", expanded=is_expanded):
-            st.json(content)
-            
-    st.markdown("</div>", unsafe_allow_html=True)
+    # Show fields as the LLM produces them; runs on the script thread, so Streamlit calls are safe here
+    preview = st.empty()
+    extracted = {}
+    try:
+        async for extracted in extraction_agent.aextract_stream(raw_text, hints=hints):
+            preview.code(orjson.dumps(merge_fields(found, extracted), option=orjson.OPT_INDENT_2).decode(), language="json")
+    finally:
+        # Each Analyze click runs on a fresh asyncio.run loop; close its connection pool with it
+        await extraction_agent.aclose()
+    preview.empty()
+    return merge_fields(found, extracted)
 
 # --- Main App ---
 def main():
@@ -163,14 +156,16 @@ def main():
         api_key = st.text_input("OpenRouter Key", value=os.getenv("OPENROUTER_API_KEY", ""), type="password")
         model = st.selectbox("Model", ["openai/gpt-4o", "openai/gpt-4o-mini", "anthropic/claude-3-opus"])
         
-        # OCR Check
-        import shutil
-        tesseract_real = shutil.which("tesseract") is not None
+        # OCR Check (probed once per process)
+        tesseract = tesseract_status()
+        tesseract_real = tesseract["installed"]
         
         st.subheader("OCR Engine")
         st.info(f"PDF Engine: {'✅ Ready' if True else '❌'}")
         if tesseract_real:
             st.success("Tesseract: ✅ Ready")
+            if tesseract["languages"] and "ara" not in tesseract["languages"]:
+                st.warning("Arabic language pack: ⚠️ Not Found")
         else:
             st.warning("Tesseract: ⚠️ Not Found")
 
@@ -202,12 +197,32 @@ def main():
         uploaded_file = st.file_uploader("Upload Invoice", type=["pdf", "png", "jpg"], label_visibility="collapsed")
         
         if uploaded_file:
-            # Save File
-            temp_dir = Path("temp_uploads")
-            temp_dir.mkdir(exist_ok=True)
-            file_path = temp_dir / uploaded_file.name
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+            # Save File - once per upload, under a unique name so concurrent sessions can't collide
+            if st.session_state.upload_id != uploaded_file.file_id:
+                # Stream to disk in 1 MiB chunks rather than copying the whole upload into memory,
+                # hashing on the way so the agents' caches don't have to re-read the file
+                uploaded_file.seek(0)
+                digest = hashlib.sha256()
+                with tempfile.NamedTemporaryFile(
+                    dir=get_upload_dir(), suffix=Path(uploaded_file.name).suffix.lower(), delete=False
+                ) as f:
+                    for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+                        digest.update(chunk)
+                        f.write(chunk)
+                file_hash = digest.hexdigest()
+                
+                if st.session_state.upload_path:
+                    Path(st.session_state.upload_path).unlink(missing_ok=True)
+                st.session_state.upload_id = uploaded_file.file_id
+                st.session_state.upload_path = f.name
+                
+                # A different document invalidates the previous run's results
+                if st.session_state.file_hash != file_hash:
+                    st.session_state.file_hash = file_hash
+                    st.session_state.ingestion_result = None
+                    st.session_state.extraction_result = None
+                    st.session_state.processing_complete = False
+            file_path = Path(st.session_state.upload_path)
             
             # Show Preview
             if uploaded_file.type == "application/pdf":
@@ -219,35 +234,53 @@ def main():
             if st.button("✨ Analyze Invoice", type="primary", width="stretch"):
                 with st.spinner("🤖 Agents working... Data Ingestion & Extraction..."):
                     # Step 1: Ingest
-                    ingest_res = orchestrator.document_agent.process(str(file_path))
+                    ocr_progress = st.empty()
+                    def on_page_done(done, total):
+                        ocr_progress.progress(done / total, text=f"OCR page {done}/{total}")
+                    ingest_res = orchestrator.ingest(
+                        str(file_path),
+                        progress_callback=on_page_done,
+                        file_hash=st.session_state.file_hash
+                    )
+                    ocr_progress.empty()
                     st.session_state.ingestion_result = ingest_res
                     
                     if ingest_res.get("raw_text"):
                         # Step 2: Extract
-                        extract_res = orchestrator.extraction_agent.extract(ingest_res["raw_text"])
+                        extract_res = asyncio.run(stream_extraction(orchestrator.extraction_agent, ingest_res["raw_text"]))
                         st.session_state.extraction_result = extract_res
                         st.session_state.processing_complete = False  # Reset final flag
-                        st.rerun()
                     else:
                         st.error("No text extracted!")
 
     # --- 2. Pipeline Results & Human in Loop ---
     with col_pipeline:
-        st.subheader("2. Agent Workflow")
-        
-        # Step 1: OCR Result
-        if st.session_state.ingestion_result:
-            render_step_card(
-                "Document Ingestion", 
-                "👁️", 
-                "success", 
-                {"source": st.session_state.ingestion_result.get("source_type"), "text_len": len(st.session_state.ingestion_result.get("raw_text", ""))}
-            )
+        render_pipeline(orchestrator)
+
+@st.fragment
+def render_pipeline(orchestrator):
+    # Runs as a fragment so submitting the verification form only reruns this column
+    st.subheader("2. Agent Workflow")
 
-        # Step 2: Extraction & Verification
-        if st.session_state.extraction_result:
-            # If we haven't finished processing, show the edit form
-            if not st.session_state.processing_complete:
+    # Step 1: OCR Result
+    if st.session_state.ingestion_result:
+        render_step_card(
+            "Document Ingestion", 
+            "👁️", 
+            "success", 
+            {
+                "source": st.session_state.ingestion_result.get("source_type"),
+                "method": st.session_state.ingestion_result.get("extraction_method"),
+                "text_len": len(st.session_state.ingestion_result.get("raw_text", ""))
+            }
+        )
+
+    # Step 2: Extraction & Verification
+    if st.session_state.extraction_result:
+        # If we haven't finished processing, show the edit form
+        if not st.session_state.processing_complete:
+            verification = st.empty()
+            with verification.container():
                 st.markdown("### 🕵️ Human Verification Required")
                 st.info("Please review the AI's extraction before commiting to the database.")
                 
@@ -264,64 +297,69 @@ def main():
                     
                     submitted = st.form_submit_button("✅ Approve & Save", type="primary", width="stretch")
                     
-                    if submitted:
-                        # Update data with user edits
-                        edited_data = {
-                            "biller_name": biller,
-                            "biller_address": address,
-                            "total_amount": float(amount) if amount and amount != 'None' else 0,
-                            "due_date": date
-                        }
-                        
-                        # Step 3: Validation
-                        val_res = orchestrator.validation_agent.validate(edited_data)
-                        
-                        # Step 4: Decision
-                        dec_res = orchestrator.tool_decision_agent.decide(val_res, edited_data)
-                        
-                        # Step 5: DB Write
-                        db_res = None
-                        if dec_res["should_write"]:
-                            db_res = orchestrator.database_tool.write_invoice_to_db(dec_res["data_to_write"])
-                        
-                        # Save final state results to display
-                        st.session_state.final_results = {
-                            "validation": val_res,
-                            "decision": dec_res,
-                            "db": db_res
-                        }
-                        st.session_state.processing_complete = True
-                        st.rerun()
-
-            else:
-                # Show Final Results (Read Only Card)
-                render_step_card("Information Extraction", "🧠", "success", st.session_state.extraction_result)
+            if submitted:
+                # Update data with user edits
+                edited_data = {
+                    "biller_name": biller,
+                    "biller_address": address,
+                    "total_amount": float(amount) if amount and amount != 'None' else 0,
+                    "due_date": date
+                }
                 
-                final = st.session_state.final_results
+                # Step 3: Validation
+                val_res = orchestrator.validation_agent.validate(edited_data)
                 
-                # Validation
-                status_v = "success" if final["validation"]["status"] == "valid" else "error"
-                render_step_card("Validation Agent", "🛡️", status_v, final["validation"], is_expanded=True)
+                # Step 4: Decision
+                duplicate = orchestrator.database_tool.invoice_exists(edited_data)
+                dec_res = orchestrator.tool_decision_agent.decide(val_res, edited_data, duplicate)
                 
-                # DB Write
-                if final["decision"]["should_write"]:
-                    db_stat = "success" if final["db"] and final["db"].get("success") else "error"
-                    render_step_card("Database Tool", "💾", db_stat, final["db"])
-                    
-                    if db_stat == "success":
-                        st.balloons()
-                        st.success("🎉 Process Completed Successfully!")
-                else:
-                    render_step_card("Database Tool", "💾", "pending", {"reason": "Skipped due to validation failure"})
-                    st.warning("Stopped by Agent Guardrails.")
+                # Step 5: DB Write
+                db_res = None
+                if dec_res["should_write"]:
+                    db_res = orchestrator.database_tool.write_invoice_to_db(dec_res["data_to_write"], skip_duplicates=True)
+                
+                # Save final state results to display
+                st.session_state.final_results = {
+                    "validation": val_res,
+                    "decision": dec_res,
+                    "db": db_res
+                }
+                st.session_state.processing_complete = True
+                # Swap the form for the results in this same pass instead of forcing a rerun
+                verification.empty()
+
+        if st.session_state.processing_complete:
+            # Show Final Results (Read Only Card)
+            extraction = st.session_state.extraction_result
+            render_step_card("Information Extraction", "🧠", "success", {field: extraction.get(field) for field in INVOICE_FIELDS})
+            
+            final = st.session_state.final_results
+            
+            # Validation
+            status_v = "success" if final["validation"]["status"] == "valid" else "error"
+            render_step_card("Validation Agent", "🛡️", status_v, final["validation"], is_expanded=True)
+            
+            # DB Write
+            if final["decision"]["should_write"]:
+                db_stat = "success" if final["db"] and final["db"].get("success") else "error"
+                if final["db"] and final["db"].get("duplicate"):
+                    db_stat = "pending"
+                render_step_card("Database Tool", "💾", db_stat, final["db"])
+                
+                if db_stat == "success":
+                    st.balloons()
+                    st.success("🎉 Process Completed Successfully!")
+            else:
+                render_step_card("Database Tool", "💾", "pending", {"reason": final["decision"]["reason"]})
+                st.warning("Stopped by Agent Guardrails.")
 
-        elif not st.session_state.ingestion_result:
-            # Empty state placeholder
-            st.markdown("""
-            <div style="border: 2px dashed #e2e8f0; border-radius:12px; height:300px; display:flex; align-items:center; justify-content:center; color:#94a3b8;">
-                waiting for document...
-            </div>
-            """, unsafe_allow_html=True)
+    elif not st.session_state.ingestion_result:
+        # Empty state placeholder
+        st.markdown("""
+        <div style="border: 2px dashed #e2e8f0; border-radius:12px; height:300px; display:flex; align-items:center; justify-content:center; color:#94a3b8;">
+            waiting for document...
+        </div>
+        """, unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()
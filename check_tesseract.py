@@ -5,7 +5,68 @@ Helper script to check Tesseract OCR installation and provide setup guidance.
 import shutil
 import platform
 import os
+import functools
+import subprocess
 from pathlib import Path
+from typing import Dict, Any, Tuple
+
+try:
+    import tesserocr  # In-process probe - no subprocess needed
+except ImportError:
+    tesserocr = None
+
+
+@functools.lru_cache(maxsize=None)
+def tesseract_status() -> Dict[str, Any]:
+    """
+    Probe the Tesseract installation once per process.
+    
+    Uses tesserocr when it is installed (no subprocess at all); otherwise
+    runs the tesseract binary for its version and language list.
+    
+    Returns:
+        Dictionary with installed, path, version and languages
+    """
+    tesseract_path = shutil.which("tesseract")
+    status = {
+        "installed": tesseract_path is not None,
+        "path": tesseract_path,
+        "version": None,
+        "languages": ()
+    }
+    if tesseract_path is None:
+        return status
+    
+    if tesserocr is not None:
+        try:
+            status["version"] = tesserocr.tesseract_version().split('\n')[0]
+            status["languages"] = tuple(tesserocr.get_languages()[1])
+            return status
+        except Exception:
+            pass
+    
+    status["version"] = _run_tesseract("--version")[0] or None
+    status["languages"] = tuple(_run_tesseract("--list-langs")[1:])
+    return status
+
+
+def _run_tesseract(flag: str) -> Tuple[str, ...]:
+    """Run the tesseract binary with a single info flag and return its non-empty output lines."""
+    try:
+        result = subprocess.run(
+            ["tesseract", flag],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+    except Exception:
+        return ("",)
+    if result.returncode != 0:
+        return ("",)
+    # Older releases print --version to stderr
+    output = result.stdout or result.stderr
+    lines = tuple(line.strip() for line in output.splitlines() if line.strip())
+    return lines or ("",)
 
 
 def check_tesseract():
@@ -17,50 +78,28 @@ def check_tesseract():
     print()
     
     # Check if Tesseract is in PATH
-    tesseract_path = shutil.which("tesseract")
+    status = tesseract_status()
     
-    if tesseract_path:
+    if status["installed"]:
         print("✅ Tesseract OCR is installed!")
-        print(f"   Location: {tesseract_path}")
+        print(f"   Location: {status['path']}")
         print()
         
-        # Try to get version
-        try:
-            import subprocess
-            result = subprocess.run(
-                ["tesseract", "--version"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.returncode == 0:
-                version_line = result.stdout.split('\n')[0]
-                print(f"   Version: {version_line}")
-        except:
-            pass
+        if status["version"]:
+            print(f"   Version: {status['version']}")
         
         # Check for Arabic language pack
         print()
         print("Checking for Arabic language pack...")
-        try:
-            import subprocess
-            result = subprocess.run(
-                ["tesseract", "--list-langs"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.returncode == 0:
-                langs = result.stdout.strip().split('\n')
-                if 'ara' in langs:
-                    print("✅ Arabic language pack is installed!")
-                else:
-                    print("⚠️  Arabic language pack not found")
-                    print("   Install it for better Arabic invoice processing")
-                    print("   Download from: https://github.com/tesseract-ocr/tessdata")
-                    print("   Place in: C:\\Program Files\\Tesseract-OCR\\tessdata\\")
-        except Exception as e:
-            print(f"⚠️  Could not check language packs: {e}")
+        if not status["languages"]:
+            print("⚠️  Could not check language packs")
+        elif 'ara' in status["languages"]:
+            print("✅ Arabic language pack is installed!")
+        else:
+            print("⚠️  Arabic language pack not found")
+            print("   Install it for better Arabic invoice processing")
+            print("   Download from: https://github.com/tesseract-ocr/tessdata")
+            print("   Place in: C:\\Program Files\\Tesseract-OCR\\tessdata\\")
         
         print()
         print("=" * 60)
@@ -6,7 +6,7 @@ Demonstrates programmatic usage without the UI.
 import os
 from dotenv import load_dotenv
 from orchestrator import InvoiceProcessingOrchestrator
-import json
+import orjson
 
 load_dotenv()
 
@@ -60,6 +60,7 @@ def main():
         output = step.get("output", {})
         print(f"   Document ID: {output.get('document_id', 'N/A')}")
         print(f"   Source Type: {output.get('source_type', 'N/A')}")
+        print(f"   Extraction Method: {output.get('extraction_method', 'N/A')}")
         raw_text = output.get("raw_text", "")
         print(f"   Raw Text Length: {len(raw_text)} characters")
         if len(raw_text) > 0:
@@ -116,8 +117,8 @@ def main():
     
     # Save full results to JSON
     output_file = "example_results.json"
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
     print(f"\n💾 Full results saved to: {output_file}")
     
     print("\n" + "=" * 60)
@@ -3,20 +3,53 @@ Master Orchestrator
 Coordinates all agents in the invoice processing pipeline.
 """
 
-from typing import Dict, Any, Optional
-from agents.document_ingestion_agent import DocumentIngestionAgent
-from agents.extraction_agent import ExtractionAgent
+import asyncio
+import functools
+import os
+import threading
+from typing import Dict, Any, List, Optional, Callable, TYPE_CHECKING
 from agents.validation_agent import ValidationAgent
 from agents.tool_decision_agent import ToolDecisionAgent
 from tools.database_tool import DatabaseTool
 from prompts import SYSTEM_PROMPT
+from preprocess import fast_extract, merge_fields
+
+if TYPE_CHECKING:
+    from agents.document_ingestion_agent import DocumentIngestionAgent
+    from agents.extraction_agent import ExtractionAgent
+
+# Heavy agents (OCR libraries, OpenAI/httpx) are imported and built on first use,
+# so importing the orchestrator - and painting the Streamlit UI - stays fast.
+# The lock keeps concurrent sessions from building the same agent twice.
+_agent_build_lock = threading.Lock()
+
+# OCR engines (tesserocr handle, EasyOCR reader) are not thread-safe, and each document
+# agent is shared by every orchestrator and session in the process - so ingestion is
+# serialized per shared agent (keyed like _build_document_agent). Multi-page PDFs are
+# already parallelized inside the ingestion agent.
+_ingestion_locks = {False: threading.Lock(), True: threading.Lock()}
+
+
+@functools.lru_cache(maxsize=2)
+def _build_document_agent(use_easyocr: bool) -> "DocumentIngestionAgent":
+    """Return the process-wide document agent for the chosen OCR engine (loads OCR models once)."""
+    from agents.document_ingestion_agent import DocumentIngestionAgent
+    return DocumentIngestionAgent(use_easyocr=use_easyocr)
+
+
+@functools.lru_cache(maxsize=8)
+def _build_extraction_agent(api_key: Optional[str], model: Optional[str]) -> "ExtractionAgent":
+    """Return the process-wide extraction agent for an API key and model (reuses its HTTP clients)."""
+    from agents.extraction_agent import ExtractionAgent
+    return ExtractionAgent(api_key=api_key, model=model)
 
 
 class InvoiceProcessingOrchestrator:
     """Orchestrates the entire invoice processing workflow."""
     
     def __init__(self, openrouter_api_key: Optional[str] = None, 
-                 model: Optional[str] = None, use_easyocr: bool = False):
+                 model: Optional[str] = None, use_easyocr: bool = False,
+                 max_concurrent_extractions: Optional[int] = None):
         """
         Initialize orchestrator with all agents.
         
@@ -24,25 +57,96 @@ class InvoiceProcessingOrchestrator:
             openrouter_api_key: OpenRouter API key for extraction agent
             model: Model to use (default: openai/gpt-4o for Arabic, or from env)
             use_easyocr: Use EasyOCR instead of Tesseract (better for low-quality images)
+            max_concurrent_extractions: Max LLM extraction calls in flight at once
+                (keeps batch processing under OpenRouter rate limits;
+                default: EXTRACTION_CONCURRENCY env or 8)
         """
-        self.document_agent = DocumentIngestionAgent(use_easyocr=use_easyocr)
-        self.extraction_agent = ExtractionAgent(api_key=openrouter_api_key, model=model)
+        # Heavy agents are built lazily (see document_agent / extraction_agent)
+        # and shared by every orchestrator with the same settings
+        self.openrouter_api_key = openrouter_api_key
+        self.model = model
+        self.use_easyocr = use_easyocr
         self.validation_agent = ValidationAgent()
         self.tool_decision_agent = ToolDecisionAgent()
-        self.database_tool = DatabaseTool()
+        self.database_tool = DatabaseTool.default()
         
         self.system_prompt = SYSTEM_PROMPT
+        
+        if max_concurrent_extractions is None:
+            max_concurrent_extractions = int(os.getenv("EXTRACTION_CONCURRENCY", "8"))
+        self.max_concurrent_extractions = max_concurrent_extractions
+        self._extraction_semaphore = None
+        self._extraction_semaphore_loop = None
+    
+    @functools.cached_property
+    def document_agent(self) -> "DocumentIngestionAgent":
+        """Document ingestion agent, created on first use."""
+        with _agent_build_lock:
+            return _build_document_agent(self.use_easyocr)
+    
+    @functools.cached_property
+    def extraction_agent(self) -> "ExtractionAgent":
+        """Extraction agent, created on first use."""
+        with _agent_build_lock:
+            return _build_extraction_agent(self.openrouter_api_key, self.model)
     
     def process_invoice(self, file_path: str) -> Dict[str, Any]:
         """
         Process invoice through the entire pipeline.
         
+        Synchronous wrapper around aprocess_invoice.
+        
+        Args:
+            file_path: Path to invoice file (PDF or image)
+            
+        Returns:
+            Dictionary with all pipeline steps and results
+        """
+        return self._run(self.aprocess_invoice(file_path))
+    
+    async def aprocess_invoices(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        Process several invoices concurrently.
+        
+        Args:
+            file_paths: Paths to invoice files (PDF or image)
+            
+        Returns:
+            Pipeline results for each file, in the same order as file_paths
+        """
+        return await asyncio.gather(*[self.aprocess_invoice(file_path) for file_path in file_paths])
+    
+    def extract_many(self, raw_texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Run only the extraction step for several already-ingested texts.
+        
+        Synchronous wrapper around aextract_many.
+        """
+        return self._run(self.aextract_many(raw_texts))
+    
+    async def aextract_many(self, raw_texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Extract fields from several texts concurrently, one LLM call each.
+        
+        Returns:
+            Extracted field dictionaries, in the same order as raw_texts
+        """
+        return await self.extraction_agent.aextract_many(raw_texts, self.max_concurrent_extractions)
+    
+    async def aprocess_invoice(self, file_path: str) -> Dict[str, Any]:
+        """
+        Process invoice through the entire pipeline without blocking the event loop.
+        
+        OCR runs in a worker thread, and the LLM call and database write are awaited,
+        so many invoices can be in flight on one event loop.
+        
         Args:
             file_path: Path to invoice file (PDF or image)
             
         Returns:
             Dictionary with all pipeline steps and results
         """
+        loop = asyncio.get_running_loop()
         pipeline_results = {
             "system_prompt": self.system_prompt,
             "steps": {}
@@ -57,7 +161,7 @@ class InvoiceProcessingOrchestrator:
                 "output": None
             }
             
-            ingestion_result = self.document_agent.process(file_path)
+            ingestion_result = await loop.run_in_executor(None, self.ingest, file_path)
             pipeline_results["steps"]["document_ingestion"]["output"] = ingestion_result
             pipeline_results["steps"]["document_ingestion"]["status"] = "success"
             
@@ -76,9 +180,21 @@ class InvoiceProcessingOrchestrator:
                 "output": None
             }
             
-            extracted_data = self.extraction_agent.extract(raw_text)
+            # Deterministic fast path first; the LLM only runs when the total or due date is
+            # still missing. Biller name/address matches are only hints for the LLM, so a
+            # skipped call leaves them empty and validation holds the record back for review.
+            found = fast_extract(raw_text)
+            pipeline_results["steps"]["extraction"]["input"]["fast_path_missing"] = found["missing"]
+            if found["missing"]:
+                hints = {field: value for field, value in found.items() if field != "missing" and value is not None}
+                async with self._get_extraction_semaphore():
+                    llm_data = await self.extraction_agent.aextract(raw_text, hints=hints)
+                extracted_data = merge_fields(found, llm_data)
+            else:
+                extracted_data = merge_fields(found, {})
             pipeline_results["steps"]["extraction"]["output"] = extracted_data
-            pipeline_results["steps"]["extraction"]["status"] = "success"
+            # A failed LLM call is reported as such; validation rejects the payload below
+            pipeline_results["steps"]["extraction"]["status"] = "error" if "error" in extracted_data else "success"
             
             # Step 3: Validation
             pipeline_results["steps"]["validation"] = {
@@ -88,7 +204,11 @@ class InvoiceProcessingOrchestrator:
                 "output": None
             }
             
-            validation_result = self.validation_agent.validate(extracted_data)
+            # Validation and the duplicate lookup are independent, so overlap them
+            validation_result, duplicate = await asyncio.gather(
+                self.validation_agent.avalidate(extracted_data),
+                self.database_tool.ainvoice_exists(extracted_data)
+            )
             pipeline_results["steps"]["validation"]["output"] = validation_result
             pipeline_results["steps"]["validation"]["status"] = "success" if validation_result["status"] == "valid" else "failed"
             
@@ -98,12 +218,13 @@ class InvoiceProcessingOrchestrator:
                 "status": "processing",
                 "input": {
                     "validation_status": validation_result["status"],
+                    "duplicate": duplicate,
                     "extracted_data": extracted_data
                 },
                 "output": None
             }
             
-            decision_result = self.tool_decision_agent.decide(validation_result, extracted_data)
+            decision_result = self.tool_decision_agent.decide(validation_result, extracted_data, duplicate)
             pipeline_results["steps"]["tool_decision"]["output"] = decision_result
             pipeline_results["steps"]["tool_decision"]["status"] = "success"
             
@@ -116,9 +237,16 @@ class InvoiceProcessingOrchestrator:
                     "output": None
                 }
                 
-                db_result = self.database_tool.write_invoice_to_db(decision_result["data_to_write"])
+                # The duplicate check is repeated atomically with the write, so a
+                # concurrent upload of the same invoice can't slip in between
+                db_result = await self.database_tool.awrite_invoice_to_db(
+                    decision_result["data_to_write"], skip_duplicates=True
+                )
                 pipeline_results["steps"]["database_write"]["output"] = db_result
-                pipeline_results["steps"]["database_write"]["status"] = "success" if db_result.get("success") else "error"
+                if db_result.get("duplicate"):
+                    pipeline_results["steps"]["database_write"]["status"] = "skipped"
+                else:
+                    pipeline_results["steps"]["database_write"]["status"] = "success" if db_result.get("success") else "error"
             else:
                 pipeline_results["steps"]["database_write"] = {
                     "agent": "Database Tool",
@@ -134,3 +262,45 @@ class InvoiceProcessingOrchestrator:
             pipeline_results["error"] = str(e)
         
         return pipeline_results
+    
+    def ingest(self, file_path: str,
+               progress_callback: Optional[Callable[[int, int], None]] = None,
+               file_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run document ingestion on the shared document agent, one document at a time.
+        
+        Use this instead of document_agent.process: the lock is shared with every
+        other orchestrator using the same OCR engine.
+        
+        Args:
+            file_path: Path to invoice file (PDF or image)
+            progress_callback: Called with (pages_done, total_pages) during OCR
+            file_hash: SHA-256 of the file, if already known (OCR cache key)
+            
+        Returns:
+            Ingestion result (document_id, raw_text, source_type, extraction_method)
+        """
+        with _ingestion_locks[bool(self.use_easyocr)]:
+            return self.document_agent.process(file_path, progress_callback=progress_callback, file_hash=file_hash)
+    
+    def _run(self, coro):
+        """asyncio.run for the sync wrappers, closing the loop's HTTP client before the loop ends."""
+        async def run_and_close():
+            try:
+                return await coro
+            finally:
+                # Only a built extraction agent can have opened a client (see extraction_agent)
+                if "extraction_agent" in self.__dict__:
+                    await self.extraction_agent.aclose()
+        
+        return asyncio.run(run_and_close())
+    
+    def _get_extraction_semaphore(self) -> asyncio.Semaphore:
+        """Return the semaphore limiting concurrent extraction calls for the running event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._extraction_semaphore
+        if semaphore is None or self._extraction_semaphore_loop is not loop:
+            semaphore = asyncio.Semaphore(self.max_concurrent_extractions)
+            self._extraction_semaphore = semaphore
+            self._extraction_semaphore_loop = loop
+        return semaphore
@@ -0,0 +1,186 @@
+"""
+Text Preprocessing
+Deterministic clean-up of OCR text before it is sent to the extraction LLM.
+"""
+
+import re
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
+
+# Arabic-Indic (٠-٩) and Extended Arabic-Indic / Persian (۰-۹) digits to ASCII,
+# plus the Arabic decimal (٫) and thousands (٬) separators
+ARABIC_DIGIT_TABLE = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬", "01234567890123456789.,")
+
+# Patterns are compiled once at import; preprocessing functions only use these objects
+_TATWEEL_RE = re.compile("ـ+")  # Decorative Arabic letter stretching (كـــبير)
+_LINE_EDGE_RE = re.compile(r"[^\S\n]*\n[^\S\n]*")  # Spaces around a line break
+_HSPACE_RE = re.compile(r"[^\S\n]+")  # Runs of spaces/tabs/NBSP, not newlines
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# Deterministic field patterns for fast_extract (run on normalized text, so digits are ASCII).
+# Labels must be explicit; anything ambiguous is left for the LLM.
+# A total label must be followed directly by the amount (optional colon / currency), so
+# "Total before discount 5000" or "Total Due Date: 2024-06-01" never match; date-shaped
+# numbers are rejected by the trailing lookahead
+_AMOUNT_AFTER_LABEL = (
+    r"\s*[:：]?\s*(?:SAR|USD|EUR|AED|KWD|QAR|BHD|OMR|EGP|JOD|LBP|ر\.س|ريال|\$|﷼)?\s*"
+    r"(\d[\d,]*(?:\.\d+)?)(?![\d/-]|\.\d)"
+)
+# Final payable labels win over a plain "Total"
+_GRAND_TOTAL_RE = re.compile(
+    r"(?<!\w)(?:grand\s+total|amount\s+due|total\s+due|total\s+payable|المبلغ\s+الإجمالي|المبلغ\s+المستحق)"
+    + _AMOUNT_AFTER_LABEL,
+    re.IGNORECASE
+)
+_TOTAL_RE = re.compile(
+    r"(?<!\w)(?<!sub )(?<!sub-)(?:total\s+amount|total|الإجمالي|المجموع)" + _AMOUNT_AFTER_LABEL,
+    re.IGNORECASE
+)
+_DUE_DATE_RE = re.compile(
+    r"(?:due\s+date|payment\s+due|تاريخ\s+الاستحقاق|الاستحقاق)[^\d\n]{0,20}"
+    r"(\d{4}[/-]\d{1,2}[/-]\d{1,2}|\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+    re.IGNORECASE
+)
+_DATE_SEP_RE = re.compile(r"[/-]")
+# Biller labels only count at the start of a line, so "Email Address:" or
+# "Shipping Company:" never match. They are still only hints for the LLM (see HINT_FIELDS).
+_BILLER_LABEL_RE = re.compile(
+    r"^(?:company\s+name|company|seller|vendor|supplier|biller|اسم\s+الشركة|اسم\s+المورد|البائع|المورد)"
+    r"\s*[:：]\s*([^\n]+)",
+    re.IGNORECASE | re.MULTILINE
+)
+_ADDRESS_LABEL_RE = re.compile(r"^(?:address|العنوان)\s*[:：]\s*([^\n]+)", re.IGNORECASE | re.MULTILINE)
+_ADDR_HINT_RE = re.compile(r"^(?:شارع|ص\.ب|P\.?\s?O\.?\s?Box)[^\n]*$", re.IGNORECASE | re.MULTILINE)
+# A customer / delivery block ("Bill To:", "Ship To:", ...) runs to the next blank line;
+# labels inside it describe the buyer, not the biller
+_RECIPIENT_BLOCK_RE = re.compile(
+    r"^(?:bill(?:ed)?\s+to|ship(?:ped)?\s+to|sold\s+to|deliver(?:ed)?\s+to|customer|client|buyer"
+    r"|العميل|المشتري|فاتورة\s+إلى)(?![^\W\d_])(?:[^\n]|\n(?!\n))*",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Fields fast_extract trusts enough to skip the LLM for
+FAST_EXTRACT_FIELDS = ("total_amount", "due_date")
+# Fields whose label matches are too ambiguous to store unreviewed; they are only
+# passed to the LLM as hints
+HINT_FIELDS = ("biller_name", "biller_address")
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize invoice text for extraction.
+
+    Converts Arabic digits to English, so the prompt doesn't have to ask the model to,
+    drops tatweel and collapses OCR whitespace padding (fewer input tokens).
+
+    Args:
+        text: Raw text extracted from an invoice
+
+    Returns:
+        Normalized text
+    """
+    text = text.translate(ARABIC_DIGIT_TABLE)
+    text = _TATWEEL_RE.sub("", text)
+    text = _LINE_EDGE_RE.sub("\n", text)
+    text = _HSPACE_RE.sub(" ", text)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def fast_extract(text: str) -> Dict[str, Any]:
+    """
+    Pull invoice fields that are stated unambiguously, without an LLM call.
+
+    Only explicitly labeled values are taken (e.g. "Total: 1,250.00 SAR",
+    "تاريخ الاستحقاق: 01/05/2024"). For the total, grand-total / amount-due
+    labels win over a plain "Total", and the last such label wins
+    (totals sit at the bottom, after subtotal and VAT lines).
+
+    Biller name and address matches are returned as well, but they are
+    hints only: "missing" never depends on them and merge_fields drops them.
+
+    Args:
+        text: Raw text extracted from an invoice
+
+    Returns:
+        Dictionary with the FAST_EXTRACT_FIELDS and HINT_FIELDS (None where
+        not found) and "missing", the FAST_EXTRACT_FIELDS still to extract
+    """
+    text = normalize(text)
+    result = {field: None for field in FAST_EXTRACT_FIELDS + HINT_FIELDS}
+
+    recipient_blocks = [match.span() for match in _RECIPIENT_BLOCK_RE.finditer(text)]
+    result["biller_name"] = _first_outside(_BILLER_LABEL_RE, text, recipient_blocks)
+    result["biller_address"] = (
+        _first_outside(_ADDRESS_LABEL_RE, text, recipient_blocks)
+        or _first_outside(_ADDR_HINT_RE, text, recipient_blocks)
+    )
+
+    amounts = [amount for amount in map(_parse_amount, _GRAND_TOTAL_RE.findall(text)) if amount]
+    if not amounts:
+        amounts = [amount for amount in map(_parse_amount, _TOTAL_RE.findall(text)) if amount]
+    if amounts:
+        result["total_amount"] = amounts[-1]
+
+    for value in _DUE_DATE_RE.findall(text):
+        result["due_date"] = _iso_date(value)
+        if result["due_date"] is not None:
+            break
+
+    result["missing"] = [field for field in FAST_EXTRACT_FIELDS if result[field] is None]
+    return result
+
+
+def merge_fields(found: Dict[str, Any], extracted: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Combine fast_extract values with LLM output; non-null LLM values win.
+
+    Only FAST_EXTRACT_FIELDS are taken from found - HINT_FIELDS reach the record
+    only through the LLM. A failed extraction (an "error" key) is returned as is -
+    regex hints must not turn it into a payload that passes validation.
+    """
+    if "error" in extracted:
+        return dict(extracted)
+    merged = {field: found.get(field) for field in FAST_EXTRACT_FIELDS}
+    merged.update((field, value) for field, value in extracted.items() if value is not None)
+    return merged
+
+
+def _first_outside(pattern: re.Pattern, text: str, blocks: List[Tuple[int, int]]) -> Optional[str]:
+    """First cleaned match of pattern that does not start inside one of the (start, end) blocks."""
+    for match in pattern.finditer(text):
+        if not any(start <= match.start() < end for start, end in blocks):
+            value = _clean_value(match.group(match.lastindex or 0))
+            if value:
+                return value
+    return None
+
+
+def _clean_value(value: str) -> Optional[str]:
+    """Trim separators and punctuation OCR leaves around a labeled value."""
+    return value.strip(" \t:|-") or None
+
+
+def _parse_amount(value: str) -> Optional[float]:
+    """Parse a matched amount ("1,250.50"); commas are thousands separators."""
+    try:
+        amount = float(value.replace(",", ""))
+    except ValueError:
+        return None
+    return amount if amount > 0 else None
+
+
+def _iso_date(value: str) -> Optional[str]:
+    """Convert a matched date to YYYY-MM-DD (day-first unless the year leads), or None if invalid."""
+    first, second, third = _DATE_SEP_RE.split(value)
+    if len(first) == 4:
+        year, month, day = int(first), int(second), int(third)
+    else:
+        day, month, year = int(first), int(second), int(third)
+        if year < 100:
+            year += 2000
+        if month > 12 and day <= 12:
+            day, month = month, day
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
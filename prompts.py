@@ -3,17 +3,15 @@ Agent Prompts Configuration
 All prompts for the Agentic Invoice Processing System
 """
 
-# System Prompt (Global - used once)
-SYSTEM_PROMPT = """You are an Agentic AI system for invoice processing.
-
-Your responsibilities are strictly separated:
-- You reason and decide.
-- You NEVER write to a database directly.
-- You ONLY return structured outputs.
-- You call tools only when explicitly allowed.
+# Rules shared by the system and orchestration prompts - stated once, here
+CORE_RULES = """Rules:
+- Reason and decide; NEVER write to a database directly.
+- Call tools only when explicitly allowed (validation passed).
+- Return only structured JSON.
+- Handle any invoice layout, language or format; assume no fixed positions, templates or hard-coded mappings."""
 
-You must work with invoices of varying layouts, languages, and formats.
-No assumptions about fixed positions or templates are allowed."""
+# System Prompt (Global - used once)
+SYSTEM_PROMPT = "You are an Agentic AI system for invoice processing.\n\n" + CORE_RULES
 
 # Agent 1: Document Ingestion Agent
 AGENT_1_DOCUMENT_INGESTION_PROMPT = """You are a Document Ingestion Agent.
@@ -34,13 +32,14 @@ Return output as JSON with this schema:
 
 # Agent 2: Information Extraction Agent (LLM Core)
 # Arabic-Optimized Extraction Prompt
-AGENT_2_EXTRACTION_PROMPT_TEMPLATE = """You are an expert Arabic invoice extraction agent.
+# Static part (instructions + schema) is sent unchanged as the system message on every call,
+# so providers can cache it as a prompt prefix; only the dynamic part carries the invoice text.
+AGENT_2_EXTRACTION_STATIC = """You are an expert Arabic invoice extraction agent.
 
 The invoice text may be:
 - Fully Arabic
 - Arabic + English mixed
 - Right-to-left (RTL) layout
-- Contains Arabic digits (٠١٢٣٤٥٦٧٨٩) or English digits
 
 Extract the following required fields:
 - biller_name (اسم الجهة / Company Name)
@@ -50,7 +49,6 @@ Extract the following required fields:
 
 Rules:
 - Understand Arabic accounting terms (فاتورة, شامل الضريبة, المبلغ الإجمالي).
-- numbers: Convert Arabic digits (٠١٢٣٤٥٦) to English.
 - dates: Convert to YYYY-MM-DD.
 - biller_name: Look for the most prominent company name at the top or logo text.
 - biller_address: Look for city/street names (e.g., شارع, الرياض, ص.ب).
@@ -64,16 +62,85 @@ Return ONLY valid JSON using this schema:
   "biller_address": string | null,
   "total_amount": number | null,
   "due_date": string | null
-}
+}"""
 
-Invoice text:
+AGENT_2_EXTRACTION_DYNAMIC = """Invoice text:
 \"\"\"
 {raw_text}
 \"\"\"
 """
 
+AGENT_2_EXTRACTION_PROMPT_TEMPLATE = AGENT_2_EXTRACTION_STATIC + "\n\n" + AGENT_2_EXTRACTION_DYNAMIC
+
+# Appended to the user message when preprocess.fast_extract already found some fields
+AGENT_2_EXTRACTION_HINTS_HEADER = """Fields already found by pattern matching (keep them unless the invoice text contradicts them):
+"""
+
+# Agent 2 (batched): several invoices in a single LLM call
+# Static instructions go in the system message; render_batch builds the user message
+AGENT_2_BATCH_EXTRACTION_STATIC = """You are an expert Arabic invoice extraction agent.
+
+You will receive several invoices at once. Each invoice starts with a "### INVOICE <n>" header
+followed by its raw text between triple quotes.
+
+Each invoice text may be:
+- Fully Arabic
+- Arabic + English mixed
+- Right-to-left (RTL) layout
+
+For EACH invoice, extract the following required fields:
+- biller_name (اسم الجهة / Company Name)
+- biller_address (العنوان / Address)
+- total_amount (المبلغ الإجمالي النهائي / Total Amount - final payable including tax)
+- due_date (تاريخ الاستحقاق / Due Date - payment due date, not invoice date)
+
+Rules:
+- Treat every invoice independently. Never mix fields between invoices.
+- Understand Arabic accounting terms (فاتورة, شامل الضريبة, المبلغ الإجمالي).
+- dates: Convert to YYYY-MM-DD.
+- biller_name: Look for the most prominent company name at the top or logo text.
+- biller_address: Look for city/street names (e.g., شارع, الرياض, ص.ب).
+- If perfect match not found, extract the most likely text candidate.
+- Return null ONLY if absolutely no text resembles the field.
+
+Return ONLY valid JSON using this schema, with exactly one result per invoice, where "invoice" is
+the <n> from that invoice's header:
+
+{
+  "results": [
+    {
+      "invoice": number,
+      "biller_name": string | null,
+      "biller_address": string | null,
+      "total_amount": number | null,
+      "due_date": string | null
+    }
+  ]
+}"""
+
+
+def render_batch(texts, ids):
+    """
+    Render several invoice texts as one batch extraction prompt.
+
+    Invoices are numbered from 1 under "### INVOICE <n>" headers; the model echoes
+    the number back in each result. Pair the prompt with AGENT_2_BATCH_EXTRACTION_STATIC
+    as the system message.
+
+    Returns:
+        (prompt, id_map) where id_map maps each invoice number to its id from ids
+    """
+    sections = []
+    id_map = {}
+    for number, (invoice_id, raw_text) in enumerate(zip(ids, texts), start=1):
+        id_map[number] = invoice_id
+        sections.append(f'### INVOICE {number}\n"""\n{raw_text}\n"""')
+    return "\n\n".join(sections) + "\n", id_map
+
+
 # Agent 3: Validation Agent
-AGENT_3_VALIDATION_PROMPT_TEMPLATE = """You are a Validation Agent.
+# Static rules first, per-invoice data last (see AGENT_2_EXTRACTION_STATIC)
+AGENT_3_VALIDATION_STATIC = """You are a Validation Agent.
 
 Input: Extracted invoice fields in JSON.
 
@@ -84,49 +151,74 @@ Validation rules:
 
 If validation passes:
 Return:
-{{
+{
   "status": "valid",
   "errors": []
-}}
+}
 
 If validation fails:
 Return:
-{{
+{
   "status": "incomplete",
   "errors": ["list of reasons"]
-}}
+}"""
 
-Extracted invoice data:
+AGENT_3_VALIDATION_DYNAMIC = """Extracted invoice data:
 {extracted_data}"""
 
+# Full template for str.format() - the static part's JSON braces are escaped
+AGENT_3_VALIDATION_PROMPT_TEMPLATE = (
+    AGENT_3_VALIDATION_STATIC.replace("{", "{{").replace("}", "}}") + "\n\n" + AGENT_3_VALIDATION_DYNAMIC
+)
+
 # Agent 4: Tool Decision Agent
-AGENT_4_TOOL_DECISION_PROMPT_TEMPLATE = """You are a Tool Decision Agent.
+# Static rules first, per-invoice data last (see AGENT_2_EXTRACTION_STATIC)
+AGENT_4_TOOL_DECISION_STATIC = """You are a Tool Decision Agent.
 
 Rules:
 - If invoice status is "valid", call the database write tool.
 - If status is "incomplete", do NOT call any tool.
+- If the invoice is already stored (duplicate), do NOT call any tool.
 
-When calling the tool, pass only the validated invoice JSON.
+When calling the tool, pass only the validated invoice JSON."""
 
-Validation status: {validation_status}
+AGENT_4_TOOL_DECISION_DYNAMIC = """Validation status: {validation_status}
 Validated invoice data: {validated_data}"""
 
+AGENT_4_TOOL_DECISION_PROMPT_TEMPLATE = AGENT_4_TOOL_DECISION_STATIC + "\n\n" + AGENT_4_TOOL_DECISION_DYNAMIC
+
+# Per-invoice messages, pre-split around their placeholders at import so rendering is a
+# plain join instead of a str.format() parse per invoice. The *_STATIC parts above go in
+# the system message; these render the dynamic user message (braces in values are safe).
+_HEAD_2, _TAIL_2 = AGENT_2_EXTRACTION_DYNAMIC.split("{raw_text}")
+_HEAD_3, _TAIL_3 = AGENT_3_VALIDATION_DYNAMIC.split("{extracted_data}")
+_HEAD_4, _REST_4 = AGENT_4_TOOL_DECISION_DYNAMIC.split("{validation_status}")
+_MID_4, _TAIL_4 = _REST_4.split("{validated_data}")
+
+
+def render_agent2(raw_text):
+    """Render the extraction user message for one invoice text."""
+    return "".join((_HEAD_2, raw_text, _TAIL_2))
+
+
+def render_agent3(data_str):
+    """Render the validation user message for serialized extracted data."""
+    return "".join((_HEAD_3, data_str, _TAIL_3))
+
+
+def render_agent4(validation_status, data_str):
+    """Render the tool-decision user message for a validation status and serialized data."""
+    return "".join((_HEAD_4, validation_status, _MID_4, data_str, _TAIL_4))
+
 # Master Orchestration Prompt
+# Pipeline steps only; the rules live in CORE_RULES (sent via SYSTEM_PROMPT)
 MASTER_ORCHESTRATION_PROMPT = """You are an Agentic Invoice Processing System.
 
 Steps:
 1. Ingest document and extract raw text.
 2. Extract required invoice fields.
 3. Validate extracted data.
-4. Decide whether to store in database.
-
-Rules:
-- No hard-coded mappings.
-- Do not assume invoice layout.
-- Use tools only when validation passes.
-- Always return structured JSON at each step.
-
-Show intermediate outputs for transparency."""
+4. Decide whether to store in database."""
 
 # Database Tool Description
 DATABASE_TOOL_DESCRIPTION = """Tool name: write_invoice_to_db
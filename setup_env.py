@@ -56,9 +56,12 @@ def create_env_file():
 # OpenRouter provides access to GPT-4o, Claude, and other models
 OPENROUTER_API_KEY={api_key}
 
-# Optional: Specify model (default: openai/gpt-4o-mini, recommended for Arabic: openai/gpt-4o)
+# Optional: Specify models per agent (recommended for Arabic extraction: openai/gpt-4o)
 # Format: provider/model-name (e.g., openai/gpt-4o, anthropic/claude-3-opus)
-OPENROUTER_MODEL={model}
+# Validation and tool decision are rule-based Python and need no model.
+OPENROUTER_MODEL_EXTRACT={model}
+# Cheaper model extraction falls back to when credits run out
+OPENROUTER_MODEL_FALLBACK=openai/gpt-4o-mini
 """
     
     # Write .env file
@@ -68,7 +71,7 @@ OPENROUTER_MODEL={model}
         
         print("\n✅ .env file created successfully!")
         print(f"   📝 API Key: {'*' * (len(api_key) - 4)}{api_key[-4:]}")
-        print(f"   🤖 Model: {model}")
+        print(f"   🤖 Extraction Model: {model}")
         print(f"\n📁 File location: {env_file.absolute()}")
         print("\n⚠️  Remember: .env file is in .gitignore and will NOT be committed to git.")
         print("\n💡 OpenRouter Dashboard: https://openrouter.ai/keys")
@@ -0,0 +1,62 @@
+"""Tests for the deterministic fast path in preprocess."""
+
+import unittest
+
+from preprocess import fast_extract, merge_fields
+
+LABELED_TOTALS = "Total: 1,250.00 SAR\nDue Date: 2024-05-01"
+
+
+class FastExtractTest(unittest.TestCase):
+    def test_total_and_due_date_decide_the_fast_path(self):
+        found = fast_extract("Seller: ACME Ltd\n" + LABELED_TOTALS)
+        self.assertEqual(found["missing"], [])
+        self.assertEqual(found["total_amount"], 1250.0)
+        self.assertEqual(found["due_date"], "2024-05-01")
+
+    def test_missing_ignores_biller_fields(self):
+        found = fast_extract("Total: 100")
+        self.assertEqual(found["missing"], ["due_date"])
+
+    def test_email_address_is_not_the_biller_address(self):
+        found = fast_extract("ACME Trading\nEmail Address: billing@acme.com\n" + LABELED_TOTALS)
+        self.assertIsNone(found["biller_address"])
+
+    def test_bill_to_block_is_not_the_biller(self):
+        found = fast_extract(
+            "Company: ACME Ltd\n\nBill To:\nCompany: Customer Corp\nAddress: 9 Buyer St\n\n" + LABELED_TOTALS
+        )
+        self.assertEqual(found["biller_name"], "ACME Ltd")
+        self.assertIsNone(found["biller_address"])
+
+    def test_bill_to_block_alone_gives_no_biller(self):
+        found = fast_extract("Bill To:\nCompany: Customer Corp\n\n" + LABELED_TOTALS)
+        self.assertIsNone(found["biller_name"])
+
+    def test_shipping_company_is_not_the_biller(self):
+        found = fast_extract("Shipping Company: DHL Express\n" + LABELED_TOTALS)
+        self.assertIsNone(found["biller_name"])
+
+
+class MergeFieldsTest(unittest.TestCase):
+    def test_biller_matches_are_hints_only(self):
+        found = fast_extract("Company: ACME Ltd\nAddress: 1 King Rd\n" + LABELED_TOTALS)
+        merged = merge_fields(found, {})
+        self.assertIsNone(merged.get("biller_name"))
+        self.assertIsNone(merged.get("biller_address"))
+        self.assertEqual(merged["total_amount"], 1250.0)
+
+    def test_llm_values_win(self):
+        found = fast_extract(LABELED_TOTALS)
+        merged = merge_fields(found, {"biller_name": "ACME Ltd", "total_amount": 1300.0, "due_date": None})
+        self.assertEqual(merged["biller_name"], "ACME Ltd")
+        self.assertEqual(merged["total_amount"], 1300.0)
+        self.assertEqual(merged["due_date"], "2024-05-01")
+
+    def test_failed_extraction_is_kept(self):
+        found = fast_extract(LABELED_TOTALS)
+        self.assertEqual(merge_fields(found, {"error": "timeout"}), {"error": "timeout"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Tests for amount parsing in the validation agent."""
+
+import unittest
+
+from agents.validation_agent import ValidationAgent
+
+
+class ParseAmountTest(unittest.TestCase):
+    def test_plain_and_formatted_amounts(self):
+        self.assertEqual(ValidationAgent._parse_amount(250), 250.0)
+        self.assertEqual(ValidationAgent._parse_amount("1250"), 1250.0)
+        self.assertEqual(ValidationAgent._parse_amount("1,250.50 SAR"), 1250.5)
+        self.assertEqual(ValidationAgent._parse_amount("$ 99.90"), 99.9)
+
+    def test_arabic_digits_and_separators(self):
+        self.assertEqual(ValidationAgent._parse_amount("SAR ١٬٢٥٠٫٥٠"), 1250.5)
+        self.assertEqual(ValidationAgent._parse_amount("٥٠٠ ريال"), 500.0)
+
+    def test_dates_are_not_amounts(self):
+        self.assertIsNone(ValidationAgent._parse_amount("2024-05-01"))
+        self.assertIsNone(ValidationAgent._parse_amount("01/05/2024"))
+
+    def test_comma_must_separate_thousands(self):
+        self.assertIsNone(ValidationAgent._parse_amount("1,5"))
+        self.assertIsNone(ValidationAgent._parse_amount("١٬٥"))
+        self.assertIsNone(ValidationAgent._parse_amount("12,34,567"))
+
+    def test_text_around_the_number_is_rejected(self):
+        self.assertIsNone(ValidationAgent._parse_amount("about 12"))
+        self.assertIsNone(ValidationAgent._parse_amount(""))
+
+    def test_validate_rejects_date_shaped_total(self):
+        result = ValidationAgent().validate({"biller_name": "ACME Ltd", "total_amount": "2024-05-01"})
+        self.assertEqual(result["status"], "incomplete")
+        self.assertIn("total_amount must be a valid number", result["errors"])
+
+
+if __name__ == "__main__":
+    unittest.main()
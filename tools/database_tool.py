@@ -4,82 +4,530 @@ Mock implementation of database write tool for demonstration.
 In production, this would connect to a real database.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Set, Tuple, Iterator, Union, ClassVar
+import os
 import json
+import atexit
+import asyncio
+import sqlite3
+import functools
+import threading
+import itertools
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import orjson  # Faster (de)serialization of invoice records
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl  # Cross-process lock on the id counter (not available on Windows)
+except ImportError:
+    fcntl = None
+
+
+def _dump_line(record: Dict[str, Any]) -> bytes:
+    """Serialize one invoice record as a JSON Lines entry."""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    # Same bytes as orjson: compact separators and raw UTF-8 (no \u escapes)
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode('utf-8')
+
+
+def _dump_json(record: Dict[str, Any]) -> bytes:
+    """Serialize one invoice record as a JSON document (SQLite raw_json column)."""
+    if orjson is not None:
+        return orjson.dumps(record)
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+def _load_json(data: bytes) -> Dict[str, Any]:
+    """Parse one JSON Lines entry or raw_json value (orjson's decode error subclasses json.JSONDecodeError)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 class DatabaseTool:
     """Tool for writing validated invoices to database."""
     
-    def __init__(self, db_path: str = "invoices_db.json"):
+    # Id assignment and the append must happen together, so concurrent writers must not interleave
+    _write_lock = threading.Lock()
+    
+    # Parsed DB contents shared by every instance in the process, keyed by absolute path.
+    # Each entry remembers the file's (mtime, size) so outside edits force a re-read.
+    _invoice_cache: Dict[str, Tuple[Tuple[int, int], List[Dict[str, Any]]]] = {}
+    
+    # Absolute DB paths already checked/created in this process, so constructing
+    # another DatabaseTool for the same file costs no filesystem calls
+    _initialized_paths: Set[str] = set()
+    
+    # Process-wide instances handed out by default(), keyed by absolute DB path
+    _default_instances: ClassVar[Dict[str, "DatabaseTool"]] = {}
+    _default_lock = threading.Lock()
+    
+    def __init__(self, db_path: Optional[str] = None, use_sqlite: bool = False, durable: bool = False):
         """
         Initialize database tool.
         
         Args:
-            db_path: Path to JSON file (mock database)
+            db_path: Path to the database file (default: invoices_db.jsonl,
+                or invoices_db.sqlite with use_sqlite)
+            use_sqlite: Store invoices in SQLite (WAL mode) instead of the
+                JSON Lines file, one invoice per line (mock database)
+            durable: fsync JSON Lines writes before returning (survives power loss,
+                at the cost of a disk flush per write)
         """
-        self.db_path = db_path
-        self._ensure_db_exists()
+        self.use_sqlite = use_sqlite
+        self.durable = durable
+        # Append handle, opened on the first write and kept until close()
+        self._append_file = None
+        self.db_path = db_path or ("invoices_db.sqlite" if use_sqlite else "invoices_db.jsonl")
+        self._cache_key = os.path.abspath(self.db_path)
+        # Sidecar holding the next invoice id, so writes never need the full DB parsed
+        self._next_id_path = f"{self.db_path}.nextid"
+        
+        if use_sqlite:
+            # One connection per tool, shared by worker threads; the lock serializes access to it
+            self._sqlite_lock = threading.Lock()
+            self._sqlite = self._connect_sqlite()
+        else:
+            self._ensure_db_exists()
     
-    def write_invoice_to_db(self, invoice_data: Dict[str, Any]) -> Dict[str, Any]:
+    @classmethod
+    def default(cls, db_path: Optional[str] = None, use_sqlite: bool = False) -> "DatabaseTool":
+        """
+        Return the process-wide tool for a database, creating it on first use.
+        
+        The shared instance keeps its file handle (or SQLite connection) open
+        across writes; it is closed when the process exits.
+        """
+        instance_path = os.path.abspath(db_path or ("invoices_db.sqlite" if use_sqlite else "invoices_db.jsonl"))
+        with cls._default_lock:
+            instance = cls._default_instances.get(instance_path)
+            if instance is None:
+                instance = cls(db_path, use_sqlite=use_sqlite)
+                cls._default_instances[instance_path] = instance
+                atexit.register(instance.close)
+            return instance
+    
+    def write_invoice_to_db(self, invoice_data: Dict[str, Any], skip_duplicates: bool = False) -> Dict[str, Any]:
         """
         Write validated invoice to database.
         
         Args:
             invoice_data: Validated invoice data
+            skip_duplicates: Don't write if a matching invoice is already stored
+                (checked under the same lock/transaction as the write)
             
         Returns:
-            Dictionary with write result
+            Dictionary with write result ("duplicate" is True if the write was skipped)
         """
         try:
-            # Load existing invoices
-            invoices = self._load_invoices()
+            invoice_id = self._store([invoice_data], skip_duplicates)[0]
+            if invoice_id is None:
+                return {
+                    "success": False,
+                    "duplicate": True,
+                    "message": "Duplicate invoice: already stored in database",
+                    "invoice_id": None
+                }
             
-            # Add metadata
-            invoice_record = {
-                **invoice_data,
-                "id": len(invoices) + 1,
-                "created_at": datetime.now().isoformat(),
-                "status": "stored"
+            return {
+                "success": True,
+                "message": "Invoice successfully written to database",
+                "invoice_id": invoice_id
             }
             
-            # Add to database
-            invoices.append(invoice_record)
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error writing to database: {str(e)}",
+                "invoice_id": None
+            }
+    
+    def bulk_write(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Write several validated invoices with a single append to the database file.
+        
+        Args:
+            records: Validated invoice data, one dict per invoice
             
-            # Save to file
-            self._save_invoices(invoices)
+        Returns:
+            Dictionary with write result; invoice_ids follow the order of records
+        """
+        try:
+            invoice_ids = self._store(records)
             
             return {
                 "success": True,
-                "message": "Invoice successfully written to database",
-                "invoice_id": invoice_record["id"]
+                "message": f"{len(invoice_ids)} invoices successfully written to database",
+                "invoice_ids": invoice_ids
             }
             
         except Exception as e:
             return {
                 "success": False,
                 "message": f"Error writing to database: {str(e)}",
-                "invoice_id": None
+                "invoice_ids": []
             }
     
+    async def awrite_invoice_to_db(self, invoice_data: Dict[str, Any], skip_duplicates: bool = False) -> Dict[str, Any]:
+        """
+        Async version of write_invoice_to_db.
+        
+        The file I/O runs in a worker thread so the event loop keeps serving
+        other invoices while this one is written.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.write_invoice_to_db, invoice_data, skip_duplicates)
+        )
+    
+    async def abulk_write(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Async version of bulk_write (the file I/O runs in a worker thread)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.bulk_write, records)
+    
+    def invoice_exists(self, invoice_data: Dict[str, Any]) -> bool:
+        """
+        Check whether an invoice with the same biller, amount and due date is already stored.
+        
+        Invoices without a due date (or biller/amount) are never reported as
+        duplicates - recurring same-amount bills would otherwise collide.
+        
+        Args:
+            invoice_data: Extracted invoice data
+            
+        Returns:
+            True if a matching invoice exists
+        """
+        key = self._duplicate_key(invoice_data)
+        if key is None:
+            return False
+        if self.use_sqlite:
+            with self._sqlite_lock:
+                return self._sqlite_has_key(key)
+        
+        return any(self._duplicate_key(invoice) == key for invoice in self._load_invoices())
+    
+    @staticmethod
+    def _duplicate_key(invoice_data: Dict[str, Any]) -> Optional[Tuple[Any, Any, Any]]:
+        """Return the (biller_name, total_amount, due_date) duplicate key, or None if any part is missing."""
+        key = (invoice_data.get("biller_name"), invoice_data.get("total_amount"), invoice_data.get("due_date"))
+        return None if None in key else key
+    
+    async def ainvoice_exists(self, invoice_data: Dict[str, Any]) -> bool:
+        """Async version of invoice_exists (the lookup runs in a worker thread)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.invoice_exists, invoice_data)
+    
+    def read_all(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream stored invoices from the database file, one record per line.
+        
+        Yields:
+            Invoice records in insertion order
+        """
+        if self.use_sqlite:
+            with self._sqlite_lock:
+                rows = self._sqlite.execute(
+                    "SELECT id, created_at, status, raw_json FROM invoices ORDER BY id"
+                ).fetchall()
+            for row in rows:
+                yield self._sqlite_record(row)
+            return
+        
+        try:
+            with open(self.db_path, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        yield _load_json(line)
+        except FileNotFoundError:
+            return
+    
+    def iter_invoices(self, limit: Optional[int] = None,
+                      since: Union[datetime, str, None] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream stored invoices without loading the whole database.
+        
+        Args:
+            limit: Stop after this many invoices
+            since: Only invoices created at or after this time (datetime or ISO string)
+            
+        Yields:
+            Invoice records in insertion order
+        """
+        if isinstance(since, datetime):
+            since = since.isoformat()
+        
+        if self.use_sqlite:
+            query = "SELECT id, created_at, status, raw_json FROM invoices"
+            params = []
+            if since is not None:
+                query += " WHERE created_at >= ?"
+                params.append(since)
+            query += " ORDER BY id"
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+            with self._sqlite_lock:
+                rows = self._sqlite.execute(query, params).fetchall()
+            for row in rows:
+                yield self._sqlite_record(row)
+            return
+        
+        invoices = self.read_all()
+        if since is not None:
+            invoices = (invoice for invoice in invoices if (invoice.get("created_at") or "") >= since)
+        yield from itertools.islice(invoices, limit)
+    
+    def close(self):
+        """Close the SQLite connection or the open append handle."""
+        if self.use_sqlite:
+            with self._sqlite_lock:
+                self._sqlite.close()
+        else:
+            with self._write_lock:
+                if self._append_file is not None:
+                    self._append_file.close()
+                    self._append_file = None
+    
+    def _connect_sqlite(self) -> sqlite3.Connection:
+        """Open the SQLite database in WAL mode and create the invoices table if needed."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS invoices ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "biller_name TEXT, "
+            "biller_address TEXT, "
+            "total_amount REAL, "
+            "due_date TEXT, "
+            "created_at TEXT, "
+            "status TEXT, "
+            "raw_json BLOB)"
+        )
+        # Duplicate lookups (invoice_exists) match on these three fields
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS invoices_dedupe ON invoices (biller_name, total_amount, due_date)"
+        )
+        conn.commit()
+        return conn
+    
     def _ensure_db_exists(self):
-        """Ensure database file exists."""
-        import os
-        if not os.path.exists(self.db_path):
-            self._save_invoices([])
+        """Ensure database file exists, converting a legacy JSON-array DB next to it if present."""
+        if self._cache_key in self._initialized_paths:
+            return
+        if os.path.exists(self.db_path):
+            self._initialized_paths.add(self._cache_key)
+            return
+        
+        invoices = []
+        legacy_path = os.path.splitext(self.db_path)[0] + ".json"
+        if legacy_path != self.db_path and os.path.exists(legacy_path):
+            try:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    invoices = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                invoices = []
+        
+        # Write a temp file and swap it in, so a crash never leaves a half-written DB behind
+        tmp_path = f"{self.db_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.writelines(_dump_line(invoice) for invoice in invoices)
+            if self.durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.db_path)
+        self._initialized_paths.add(self._cache_key)
+    
+    def _file_version(self) -> Tuple[int, int]:
+        """Return the DB file's (mtime_ns, size), used to tell whether the cache is current."""
+        stat = os.stat(self.db_path)
+        return stat.st_mtime_ns, stat.st_size
     
     def _load_invoices(self) -> list:
-        """Load invoices from database file."""
+        """
+        Load invoices from database file.
+        
+        The parsed list is cached and shared, so it is only re-read when the
+        file has changed on disk. Callers holding _write_lock may modify it.
+        """
         try:
-            with open(self.db_path, 'r') as f:
-                return json.load(f)
+            version = self._file_version()
         except FileNotFoundError:
             return []
+        
+        cached = self._invoice_cache.get(self._cache_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        try:
+            invoices = list(self.read_all())
         except json.JSONDecodeError:
             return []
+        
+        self._invoice_cache[self._cache_key] = (version, invoices)
+        return invoices
     
-    def _save_invoices(self, invoices: list):
-        """Save invoices to database file."""
-        with open(self.db_path, 'w') as f:
-            json.dump(invoices, f, indent=2)
+    def _store(self, records: List[Dict[str, Any]], skip_duplicates: bool = False) -> List[Optional[int]]:
+        """
+        Assign ids and metadata to new invoices, append them, and return their ids.
+        
+        With skip_duplicates, invoices matching a stored one (or an earlier one in
+        records) are not written and get None as their id; the check runs under
+        the write lock, so concurrent writers of the same invoice can't both win.
+        """
+        if not records:
+            return []
+        if self.use_sqlite:
+            return self._sqlite_store(records, skip_duplicates)
+        
+        with self._write_lock, self._id_counter() as counter:
+            new_records = list(records)
+            if skip_duplicates:
+                seen = {self._duplicate_key(invoice) for invoice in self._load_invoices()}
+                seen.discard(None)
+                new_records = []
+                for invoice_data in records:
+                    key = self._duplicate_key(invoice_data)
+                    if key is not None and key in seen:
+                        continue
+                    seen.add(key)
+                    new_records.append(invoice_data)
+            
+            base_id = self._read_next_id(counter)
+            
+            # Add metadata (one timestamp for the whole write)
+            created_at = datetime.now().isoformat()
+            invoice_records = [
+                {
+                    **invoice_data,
+                    "id": base_id + offset,
+                    "created_at": created_at,
+                    "status": "stored"
+                }
+                for offset, invoice_data in enumerate(new_records)
+            ]
+            if not invoice_records:
+                return [None] * len(records)
+            
+            # Extend the cached list only if it matches the file we are appending to
+            cached = self._invoice_cache.get(self._cache_key)
+            try:
+                cache_current = cached is not None and cached[0] == self._file_version()
+            except FileNotFoundError:
+                cache_current = False
+            
+            # Append lines instead of rewriting the whole file
+            try:
+                self._append(invoice_records)
+            except Exception:
+                # The file may hold a partial line now - drop the cache so the next read reloads it
+                self._invoice_cache.pop(self._cache_key, None)
+                raise
+            self._write_next_id(counter, base_id + len(invoice_records))
+            
+            if cache_current:
+                cached[1].extend(invoice_records)
+                self._invoice_cache[self._cache_key] = (self._file_version(), cached[1])
+        
+        # Map ids back onto the input order (None for skipped duplicates)
+        ids_by_record = {id(invoice_data): record["id"] for invoice_data, record in zip(new_records, invoice_records)}
+        return [ids_by_record.get(id(invoice_data)) for invoice_data in records]
+    
+    @staticmethod
+    def _sqlite_record(row: Tuple[int, str, str, bytes]) -> Dict[str, Any]:
+        """Rebuild a stored invoice record from an (id, created_at, status, raw_json) row."""
+        invoice_id, created_at, status, raw_json = row
+        return {**_load_json(raw_json), "id": invoice_id, "created_at": created_at, "status": status}
+    
+    def _sqlite_has_key(self, key: Tuple[Any, Any, Any]) -> bool:
+        """Whether a stored invoice has this duplicate key (caller holds _sqlite_lock)."""
+        return self._sqlite.execute(
+            "SELECT 1 FROM invoices WHERE biller_name = ? AND total_amount = ? AND due_date = ? LIMIT 1",
+            key
+        ).fetchone() is not None
+    
+    def _sqlite_store(self, records: List[Dict[str, Any]], skip_duplicates: bool = False) -> List[Optional[int]]:
+        """Insert new invoices in one transaction and return their ids (None for skipped duplicates)."""
+        created_at = datetime.now().isoformat()
+        invoice_ids = []
+        with self._sqlite_lock, self._sqlite:  # Commits on success, rolls back on error
+            if skip_duplicates:
+                # Take the write lock up front so the duplicate check and insert are atomic
+                # across connections too
+                self._sqlite.execute("BEGIN IMMEDIATE")
+            for invoice_data in records:
+                key = self._duplicate_key(invoice_data)
+                if skip_duplicates and key is not None and self._sqlite_has_key(key):
+                    invoice_ids.append(None)
+                    continue
+                cursor = self._sqlite.execute(
+                    "INSERT INTO invoices (biller_name, biller_address, total_amount, due_date, created_at, status, raw_json) "
+                    "VALUES (?, ?, ?, ?, ?, 'stored', ?)",
+                    (
+                        invoice_data.get("biller_name"),
+                        invoice_data.get("biller_address"),
+                        invoice_data.get("total_amount"),
+                        invoice_data.get("due_date"),
+                        created_at,
+                        _dump_json(invoice_data)
+                    )
+                )
+                invoice_ids.append(cursor.lastrowid)
+        return invoice_ids
+    
+    @contextmanager
+    def _id_counter(self):
+        """Open the id counter sidecar, locked against other processes until the block exits."""
+        with open(self._next_id_path, 'a+', encoding='utf-8') as counter:
+            if fcntl is not None:
+                fcntl.flock(counter, fcntl.LOCK_EX)  # Released when the file is closed
+            yield counter
+    
+    def _read_next_id(self, counter) -> int:
+        """Read the next free id, seeding it from the stored invoices if the sidecar is new."""
+        counter.seek(0)
+        content = counter.read().strip()
+        if content:
+            return int(content)
+        return max((invoice.get("id") or 0 for invoice in self._load_invoices()), default=0) + 1
+    
+    def _write_next_id(self, counter, next_id: int):
+        """Persist the next free id in the counter sidecar."""
+        counter.seek(0)
+        counter.truncate()
+        counter.write(str(next_id))
+        counter.flush()
+    
+    def _append_file_current(self) -> bool:
+        """Whether the kept-open append handle still points at the file at db_path."""
+        try:
+            on_disk = os.stat(self.db_path)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(self._append_file.fileno())
+        return (opened.st_dev, opened.st_ino) == (on_disk.st_dev, on_disk.st_ino)
+    
+    def _append(self, records: List[Dict[str, Any]]):
+        """Append invoice records to the database file in one write (caller holds _write_lock)."""
+        if self._append_file is not None and not self._append_file_current():
+            # The file was deleted or rotated; writing to the old handle would lose the records
+            self._append_file.close()
+            self._append_file = None
+        if self._append_file is None:
+            self._append_file = open(self.db_path, 'ab')
+        try:
+            self._append_file.write(b"".join(_dump_line(record) for record in records))
+            self._append_file.flush()
+            if self.durable:
+                os.fsync(self._append_file.fileno())
+        except Exception:
+            # Reopen on the next write rather than reuse a handle in an unknown state
+            self._append_file.close()
+            self._append_file = None
+            raise
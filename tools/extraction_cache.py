@@ -0,0 +1,79 @@
+"""
+Extraction Cache
+Persistent cache of LLM extraction results, keyed by the invoice text and model.
+Repeat invoices (re-uploads, retries) skip the extraction LLM call entirely.
+"""
+
+from typing import Dict, Any, Optional
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+import orjson
+
+
+class ExtractionCache:
+    """SQLite-backed (WAL mode) cache of extracted invoice fields."""
+
+    def __init__(self, path: str = "extraction_cache.sqlite"):
+        """
+        Initialize extraction cache.
+
+        Args:
+            path: Path to the SQLite database file (created if missing)
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # One connection shared across threads (Streamlit sessions, worker loops);
+        # the lock serializes access to it
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "text_sha256 BLOB NOT NULL, "
+            "model TEXT NOT NULL, "
+            "result_json BLOB NOT NULL, "
+            "created_at INTEGER NOT NULL, "
+            "PRIMARY KEY (text_sha256, model))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(raw_text: str) -> bytes:
+        """SHA-256 of the NFKC-normalized, stripped text (ignores width/presentation-form differences)."""
+        return hashlib.sha256(unicodedata.normalize("NFKC", raw_text).strip().encode("utf-8")).digest()
+
+    def get(self, raw_text: str, model: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached extraction for a text and model, or None on a miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_json FROM extractions WHERE text_sha256 = ? AND model = ?",
+                (self.text_hash(raw_text), model)
+            ).fetchone()
+        return orjson.loads(row[0]) if row is not None else None
+
+    def set(self, raw_text: str, model: str, result: Dict[str, Any]):
+        """
+        Store the extraction for a text and model, replacing any previous entry.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (text_sha256, model, result_json, created_at) VALUES (?, ?, ?, ?)",
+                (self.text_hash(raw_text), model, orjson.dumps(result), int(time.time()))
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()